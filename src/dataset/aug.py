@@ -1,49 +1,363 @@
-from .load import cv2, np, RGBVideoLoader
+from typing import Callable, Sequence
+from argparse import ArgumentParser
+from collections import OrderedDict
+import time
+from torch.utils.data import get_worker_info
+from .load import cv2, np, os, RGBVideoLoader
 
 # Obtenido  de https://www.kaggle.com/code/ahmedabdelfattah20/image-augmentation-using-opencv
 
+ClipKernel = Callable[[np.ndarray, np.random.Generator], np.ndarray]
+# Kernel interno: escribe el clip aumentado en `out`, ya reservado
+_Kernel = Callable[[np.ndarray, np.random.Generator, np.ndarray], np.ndarray]
+
+
+class Compose:
+    """Encadena kernels por clip compartiendo el mismo generador.
+
+    Con `out` solo el último kernel escribe en él. Es una clase y no un
+    cierre para poder enviarla a otros procesos.
+    """
+
+    def __init__(self, *kernels: ClipKernel) -> None:
+        self.kernels: tuple[ClipKernel, ...] = kernels
+
+    def __call__(
+        self,
+        video: np.ndarray,
+        rng: np.random.Generator,
+        out: np.ndarray | None = None,
+    ) -> np.ndarray:
+        *first, last = self.kernels
+        for kernel in first:
+            video = kernel(video, rng)
+        return last(video, rng) if out is None else last(video, rng, out=out)
+
+
+class AugmentedView(Sequence[np.ndarray]):
+    """Videos aumentados bajo demanda: cada índice se calcula al pedirlo.
+
+    El generador de la muestra `i` se siembra con `(seed, i)`, así que el
+    resultado no depende del orden de acceso. Con `cache_size > 0` se guardan
+    los últimos videos calculados, de solo lectura, en un LRU.
+    """
 
-class Augmentation:
     def __init__(
         self,
-        original: list[np.ndarray],
-        blurred: list[np.ndarray],
-        noised: list[np.ndarray],
-        warped: list[np.ndarray],
-        resized: list[np.ndarray],
+        videos: Sequence[np.ndarray],
+        kernel: ClipKernel,
+        seed: int = 0,
+        cache_size: int = 0,
+    ) -> None:
+        if cache_size < 0:
+            raise ValueError("El tamaño de la caché no puede ser negativo")
+
+        self.videos: Sequence[np.ndarray] = videos
+        self.kernel: ClipKernel = kernel
+        self.seed: int = seed
+        self.cache_size: int = cache_size
+        self._cache: OrderedDict[int, np.ndarray] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.videos)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        if not -len(self) <= i < len(self):
+            raise IndexError(f"Índice {i} fuera de rango")
+        i %= len(self)
+
+        if i in self._cache:
+            self._cache.move_to_end(i)
+            return self._cache[i]
+
+        video = self.kernel(self.videos[i], np.random.default_rng([self.seed, i]))
+        if self.cache_size > 0:
+            video.flags.writeable = False
+            self._cache[i] = video
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return video
+
+    def then(self, kernel: ClipKernel) -> "AugmentedView":
+        return AugmentedView(
+            self.videos, Compose(self.kernel, kernel), self.seed, self.cache_size
+        )
+
+
+class RandomPolicy:
+    """Aumento aleatorio por muestra, pensado como `transform` de un Dataset.
+
+    Cada kernel se aplica con probabilidad `p`, en orden. Dentro de un worker
+    de DataLoader el generador se resiembra con la semilla del worker para que
+    los workers no repitan la misma secuencia.
+    """
+
+    def __init__(
+        self, kernels: Sequence[ClipKernel], p: float = 0.5, seed: int | None = None
+    ) -> None:
+        if not 0.0 <= p <= 1.0:
+            raise ValueError("La probabilidad debe estar en [0, 1]")
+
+        self.kernels: list[ClipKernel] = list(kernels)
+        self.p: float = p
+        self.seed: int | None = seed
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self._worker: int | None = None
+
+    def __call__(self, video: np.ndarray) -> np.ndarray:
+        info = get_worker_info()
+        if info is not None and self._worker != info.id:
+            self._worker = info.id
+            self.rng = np.random.default_rng([info.seed % 2**32, self.seed or 0])
+
+        for kernel in self.kernels:
+            if self.rng.random() < self.p:
+                video = kernel(video, self.rng)
+        return video
+
+
+class Augmentation:
+    """Vistas perezosas de los videos originales, una por tipo de aumento."""
+
+    def __init__(
+        self, original: Sequence[np.ndarray], seed: int = 0, cache_size: int = 0
     ) -> None:
-        self.original: list[np.ndarray] = original
-        self.blurred: list[np.ndarray] = blurred
-        self.noised: list[np.ndarray] = noised
-        self.warped: list[np.ndarray] = warped
-        self.resized: list[np.ndarray] = resized
+        seeds = np.random.SeedSequence(seed).generate_state(4).tolist()
+        self.original: Sequence[np.ndarray] = original
+        self.blurred: AugmentedView = AugmentedView(
+            original, VideoAugmentator.BlurClip, seeds[0], cache_size
+        )
+        self.noised: AugmentedView = AugmentedView(
+            original, VideoAugmentator.RandomNoiseClip, seeds[1], cache_size
+        )
+        self.warped: AugmentedView = AugmentedView(
+            original, VideoAugmentator.WarpAffineClip, seeds[2], cache_size
+        )
+        self.resized: AugmentedView = AugmentedView(
+            original, VideoAugmentator.RandomResizeClip, seeds[3], cache_size
+        )
 
 
 class VideoAugmentator:
-    def __init__(self) -> None:
-        pass
+    """Aumentos de video con un único conjunto de parámetros por clip.
+
+    Los métodos `*Clip` reciben un clip `(T, H, W, C)` o un batch
+    `(B, T, H, W, C)` y aplican la misma transformación a todos los frames de
+    cada clip, sin parpadeo entre frames. El ruido HSV y la traslación operan
+    sobre el clip entero en una llamada. Los métodos por frame (`Blur`,
+    `RandomNoise`, ...) se mantienen como referencia.
+    """
+
+    def __init__(self, seed: int | None = None) -> None:
+        self.rng: np.random.Generator = np.random.default_rng(seed)
 
-    def __call__(self, dataloader: RGBVideoLoader) -> Augmentation:
+    def __call__(self, dataloader: RGBVideoLoader, cache_size: int = 0) -> Augmentation:
+        # No se calcula nada hasta que se pide una muestra
         return Augmentation(
-            original=dataloader.videos,
-            blurred=[
-                np.array([self.Blur(frame) for frame in video])
-                for video in dataloader.videos
-            ],
-            noised=[
-                np.array([self.RandomNoise(frame) for frame in video])
-                for video in dataloader.videos
-            ],
-            warped=[
-                np.array([self.WarpAffine(frame) for frame in video])
-                for video in dataloader.videos
-            ],
-            resized=[
-                np.array([self.RandomResize(frame) for frame in video])
-                for video in dataloader.videos
+            dataloader.videos, int(self.rng.integers(2**32)), cache_size
+        )
+
+    def policy(self, p: float = 0.5) -> RandomPolicy:
+        return RandomPolicy(
+            [self.BlurClip, self.RandomNoiseClip, self.WarpAffineClip, self.RandomResizeClip],
+            p,
+            int(self.rng.integers(2**32)),
+        )
+
+    @staticmethod
+    def _per_clip(
+        kernel: _Kernel,
+        video: np.ndarray,
+        rng: np.random.Generator | None,
+        out: np.ndarray | None = None,
+    ) -> np.ndarray:
+        rng = rng or np.random.default_rng()
+        if video.ndim not in (4, 5):
+            raise ValueError("Se esperaba un clip (T, H, W, C) o un batch (B, T, H, W, C)")
+
+        if out is None:
+            out = np.empty_like(video)
+        elif out.shape != video.shape or out.dtype != video.dtype:
+            raise ValueError(f"La salida debe ser {video.dtype} {video.shape}")
+
+        if video.ndim == 4:
+            return kernel(video, rng, out)
+
+        for clip, dst in zip(video, out):
+            kernel(clip, rng, dst)
+        return out
+
+    @staticmethod
+    def _framewise(
+        frames: np.ndarray, op: Callable[[np.ndarray, np.ndarray], None], out: np.ndarray
+    ) -> np.ndarray:
+        """Aplica una operación 2D de OpenCV a cada frame escribiendo en `out`.
+
+        Plegar el tiempo en los canales (`(H, W, T * C)`) permite una sola
+        llamada, pero OpenCV no vectoriza con tantos canales y resulta unas 5
+        veces más lento que una llamada por frame sin reservar memoria.
+        """
+        for frame, dst in zip(frames, out):
+            op(frame, dst)
+        return out
+
+    @staticmethod
+    def _blur_clip(
+        video: np.ndarray, rng: np.random.Generator, out: np.ndarray
+    ) -> np.ndarray:
+        ksize = int(rng.integers(5, 15))
+        return VideoAugmentator._framewise(
+            video, lambda frame, dst: cv2.blur(frame, (ksize, ksize), dst=dst), out
+        )
+
+    @staticmethod
+    def _hsv_shift_clip(
+        video: np.ndarray, rng: np.random.Generator, out: np.ndarray
+    ) -> np.ndarray:
+        dh, ds, dv = (int(x) for x in rng.integers((0, 0, 0), (100, 20, 10)))
+
+        # Un desplazamiento HSV por clip, aplicado con una tabla por canal:
+        # el tono da la vuelta en 180 y la saturación y el valor se saturan en 255
+        values = np.arange(256)
+        lut = np.stack(
+            [
+                np.where(values < 180, (values + dh) % 180, values),
+                np.minimum(values + ds, 255),
+                np.minimum(values + dv, 255),
             ],
+            axis=-1,
+        ).astype(np.uint8)[:, None, :]
+
+        hsv = np.empty(video.shape[1:], dtype=np.uint8)
+        for frame, dst in zip(video, out):
+            cv2.cvtColor(frame, cv2.COLOR_RGB2HSV, dst=hsv)
+            cv2.LUT(hsv, lut, dst=hsv)
+            cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB, dst=dst)
+        return out
+
+    @staticmethod
+    def _noise_field_clip(
+        video: np.ndarray, rng: np.random.Generator, out: np.ndarray
+    ) -> np.ndarray:
+        (_, h, w, _) = video.shape
+
+        # Campos de ruido por píxel sorteados una vez y reutilizados en todo el clip
+        hue = rng.integers(0, 100, (h, w), dtype=np.uint16)
+        sv = np.zeros((h, w, 3), dtype=np.uint8)
+        sv[..., 1] = rng.integers(0, 20, (h, w), dtype=np.uint8)
+        sv[..., 2] = rng.integers(0, 10, (h, w), dtype=np.uint8)
+
+        hsv = np.empty((h, w, 3), dtype=np.uint8)
+        shifted = np.empty((h, w), dtype=np.uint16)
+        for frame, dst in zip(video, out):
+            cv2.cvtColor(frame, cv2.COLOR_RGB2HSV, dst=hsv)
+            np.add(hsv[..., 0], hue, out=shifted)
+            np.remainder(shifted, 180, out=shifted)
+            # Suma saturada: sin la vuelta de uint8 que tenía s + randint(...)
+            cv2.add(hsv, sv, dst=hsv)
+            np.copyto(hsv[..., 0], shifted, casting="unsafe")
+            cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB, dst=dst)
+        return out
+
+    @staticmethod
+    def _brightness_contrast_clip(
+        video: np.ndarray, rng: np.random.Generator, out: np.ndarray
+    ) -> np.ndarray:
+        alpha = rng.uniform(0.8, 1.2)
+        beta = rng.uniform(-20, 20)
+        lut = np.clip(np.arange(256) * alpha + beta, 0, 255).round().astype(np.uint8)
+        return VideoAugmentator._framewise(
+            video, lambda frame, dst: cv2.LUT(frame, lut, dst=dst), out
+        )
+
+    @staticmethod
+    def _translate_clip(
+        video: np.ndarray, rng: np.random.Generator, out: np.ndarray
+    ) -> np.ndarray:
+        (_, h, w, _) = video.shape
+        tx = int(rng.integers(-int(w * 0.25), int(w * 0.25)))
+        ty = int(rng.integers(-int(h * 0.25), int(h * 0.25)))
+
+        # Una traslación entera es un recorte desplazado: no hace falta interpolar
+        out[...] = 0
+        out[:, max(ty, 0) : h + min(ty, 0), max(tx, 0) : w + min(tx, 0)] = video[
+            :, max(-ty, 0) : h - max(ty, 0), max(-tx, 0) : w - max(tx, 0)
+        ]
+        return out
+
+    @staticmethod
+    def _resize_clip(
+        video: np.ndarray, rng: np.random.Generator, out: np.ndarray
+    ) -> np.ndarray:
+        (_, h, w, _) = video.shape
+        tx = int(rng.integers(-int(w * 0.25), int(w * 0.25)))
+        ty = int(rng.integers(-int(h * 0.25), int(h * 0.25)))
+        (x, y) = (max(tx, 0), max(ty, 0))
+
+        crop = video[:, y : y + h - abs(ty), x : x + w - abs(tx)]
+        return VideoAugmentator._framewise(
+            crop, lambda frame, dst: cv2.resize(frame, (w, h), dst=dst), out
         )
 
+    # Todos escriben en `out` si se da; los de color trabajan píxel a píxel y
+    # admiten `out=video` para operar in situ, los geométricos no
+
+    @staticmethod
+    def BlurClip(
+        video: np.ndarray,
+        rng: np.random.Generator | None = None,
+        out: np.ndarray | None = None,
+    ) -> np.ndarray:
+        return VideoAugmentator._per_clip(VideoAugmentator._blur_clip, video, rng, out)
+
+    @staticmethod
+    def RandomNoiseClip(
+        video: np.ndarray,
+        rng: np.random.Generator | None = None,
+        out: np.ndarray | None = None,
+    ) -> np.ndarray:
+        return VideoAugmentator._per_clip(
+            VideoAugmentator._hsv_shift_clip, video, rng, out
+        )
+
+    @staticmethod
+    def NoiseFieldClip(
+        video: np.ndarray,
+        rng: np.random.Generator | None = None,
+        out: np.ndarray | None = None,
+    ) -> np.ndarray:
+        return VideoAugmentator._per_clip(
+            VideoAugmentator._noise_field_clip, video, rng, out
+        )
+
+    @staticmethod
+    def BrightnessContrastClip(
+        video: np.ndarray,
+        rng: np.random.Generator | None = None,
+        out: np.ndarray | None = None,
+    ) -> np.ndarray:
+        return VideoAugmentator._per_clip(
+            VideoAugmentator._brightness_contrast_clip, video, rng, out
+        )
+
+    @staticmethod
+    def WarpAffineClip(
+        video: np.ndarray,
+        rng: np.random.Generator | None = None,
+        out: np.ndarray | None = None,
+    ) -> np.ndarray:
+        return VideoAugmentator._per_clip(
+            VideoAugmentator._translate_clip, video, rng, out
+        )
+
+    @staticmethod
+    def RandomResizeClip(
+        video: np.ndarray,
+        rng: np.random.Generator | None = None,
+        out: np.ndarray | None = None,
+    ) -> np.ndarray:
+        return VideoAugmentator._per_clip(VideoAugmentator._resize_clip, video, rng, out)
+
     @staticmethod
     def Blur(frame: np.ndarray):
         ksize = np.random.randint(5, 15)
@@ -54,9 +368,10 @@ class VideoAugmentator:
         hsv = cv2.cvtColor(frame, cv2.COLOR_RGB2HSV)
         h, s, v = cv2.split(hsv)
 
-        h = (h + np.random.randint(0, 100, h.shape, np.uint8)) % 180
-        s = np.clip(s + np.random.randint(0, 20, s.shape, np.uint8), 0, 255)
-        v = np.clip(v + np.random.randint(0, 10, v.shape, np.uint8), 0, 255)
+        # En uint8 la suma da la vuelta antes del módulo o del recorte
+        h = ((h + np.random.randint(0, 100, h.shape, np.uint16)) % 180).astype(np.uint8)
+        s = cv2.add(s, np.random.randint(0, 20, s.shape, np.uint8))
+        v = cv2.add(v, np.random.randint(0, 10, v.shape, np.uint8))
 
         hsv = cv2.merge([h, s, v])
         return cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
@@ -87,3 +402,53 @@ class VideoAugmentator:
         rsize = frame[y : y + h, x : x + w]
         rsize = cv2.resize(rsize, (cols, rows))
         return rsize
+
+
+def benchmark(videos: list[np.ndarray], repeats: int = 3) -> dict[str, dict[str, float]]:
+    """Frames/s de cada aumento: bucle por frame frente a un kernel por clip."""
+    frames = sum(len(video) for video in videos)
+    rng = np.random.default_rng(0)
+    kernels = {
+        "blur": (VideoAugmentator.Blur, VideoAugmentator.BlurClip),
+        "noise": (VideoAugmentator.RandomNoise, VideoAugmentator.RandomNoiseClip),
+        "field": (VideoAugmentator.RandomNoise, VideoAugmentator.NoiseFieldClip),
+        "warp": (VideoAugmentator.WarpAffine, VideoAugmentator.WarpAffineClip),
+        "resize": (VideoAugmentator.RandomResize, VideoAugmentator.RandomResizeClip),
+    }
+
+    result: dict[str, dict[str, float]] = {}
+    for name, (per_frame, per_clip) in kernels.items():
+        best_frame = best_clip = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for video in videos:
+                np.array([per_frame(frame) for frame in video])
+            best_frame = min(best_frame, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for video in videos:
+                per_clip(video, rng)
+            best_clip = min(best_clip, time.perf_counter() - start)
+
+        result[name] = {"frame": frames / best_frame, "clip": frames / best_clip}
+    return result
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Aumentos por frame frente a aumentos por clip")
+    parser.add_argument("--videos", required=True)
+    parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+    loader = RGBVideoLoader()
+    videos = [
+        loader._load_video(os.path.join(args.videos, f))
+        for f in sorted(os.listdir(args.videos))
+        if RGBVideoLoader.is_video(f)
+    ]
+
+    for name, fps in benchmark(videos, args.repeats).items():
+        print(
+            f"{name:<8} por frame: {fps['frame']:8.1f} frames/s  "
+            f"por clip: {fps['clip']:8.1f} frames/s  ({fps['clip'] / fps['frame']:.1f}x)"
+        )
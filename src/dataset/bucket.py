@@ -0,0 +1,178 @@
+from typing import Iterator
+from argparse import ArgumentParser
+import json
+from torch.utils.data import Sampler
+from .load import cv2, np, os, VideoBatcher
+from .resample import FpsResampler
+
+
+class FrameCountManifest:
+    """Número de frames de cada video a los fps del loader, guardado en JSON.
+
+    El recuento sale de la cabecera del contenedor (CAP_PROP_FRAME_COUNT y
+    CAP_PROP_FPS), sin decodificar, y se reutiliza mientras no cambie el mtime.
+    """
+
+    def __init__(self, path: str, fps: int = 16) -> None:
+        self.path: str = path
+        self.fps: int = fps
+        self.videos: dict[str, dict[str, int]] = {}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            if manifest["fps"] == fps:
+                self.videos = manifest["videos"]
+
+    def count(self, video_path: str) -> int:
+        key = os.path.abspath(video_path)
+        mtime = os.stat(video_path).st_mtime_ns
+        entry = self.videos.get(key)
+        if entry is not None and entry["mtime"] == mtime:
+            return entry["frames"]
+
+        cap = cv2.VideoCapture(video_path)
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+
+        if count <= 0:
+            raise RuntimeError(f"El video {video_path} no indica su número de frames")
+
+        frames = FpsResampler.expected(count, fps if fps > 0 else self.fps, self.fps)
+        self.videos[key] = {"mtime": mtime, "frames": frames}
+        return frames
+
+    def counts(self, video_paths: list[str]) -> list[int]:
+        return [self.count(path) for path in video_paths]
+
+    def save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"fps": self.fps, "videos": self.videos}, f)
+        os.replace(tmp, self.path)
+
+
+def padded_frames(counts: np.ndarray, batches: list[list[int]]) -> tuple[int, int]:
+    """Frames procesados (rellenando al más largo del batch) y frames reales."""
+    processed = sum(int(counts[batch].max()) * len(batch) for batch in batches)
+    return processed, int(sum(counts[batch].sum() for batch in batches))
+
+
+class BucketBatchSampler(Sampler[list[int]]):
+    """Agrupa clips de longitud parecida para minimizar el relleno temporal.
+
+    Ordena los índices por número de frames y llena cada batch mientras la
+    proporción de frames de relleno no supere `max_padding`; si se supera, el
+    batch se cierra antes de llegar a `batch_size`. El orden de los batches se
+    baraja en cada época. Sirve como `batch_sampler` de un DataLoader sobre
+    VideoDataset.
+    """
+
+    def __init__(
+        self,
+        counts: list[int],
+        batch_size: int,
+        max_padding: float = 0.1,
+        shuffle: bool = True,
+        seed: int = 0,
+    ) -> None:
+        if batch_size <= 0:
+            raise ValueError("El tamaño de batch debe ser mayor que 0")
+
+        if not 0.0 <= max_padding < 1.0:
+            raise ValueError("La proporción de relleno debe estar en [0, 1)")
+
+        self.counts: np.ndarray = np.asarray(counts, dtype=np.int64)
+        self.batch_size: int = batch_size
+        self.max_padding: float = max_padding
+        self.shuffle: bool = shuffle
+        self.seed: int = seed
+        self.epoch: int = 0
+
+    @classmethod
+    def from_batcher(
+        cls, batcher: VideoBatcher, manifest: FrameCountManifest, **kwargs
+    ) -> "BucketBatchSampler":
+        counts = manifest.counts(batcher.video_paths)
+        manifest.save()
+        return cls(counts, batcher.batch_size, **kwargs)
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def batches(self) -> list[list[int]]:
+        rng = np.random.default_rng([self.seed, self.epoch])
+
+        # Los empates se desordenan para que cambien los batches entre épocas
+        ties = rng.random(len(self.counts)) if self.shuffle else np.zeros(len(self.counts))
+        order = np.lexsort((ties, self.counts))
+
+        batches: list[list[int]] = []
+        batch: list[int] = []
+        total = 0
+        for i in order.tolist():
+            count = int(self.counts[i])
+            # El más largo es siempre el último en entrar: la lista está ordenada
+            if batch and (
+                len(batch) == self.batch_size
+                or 1 - (total + count) / (count * (len(batch) + 1)) > self.max_padding
+            ):
+                batches.append(batch)
+                batch, total = [], 0
+            batch.append(i)
+            total += count
+
+        if batch:
+            batches.append(batch)
+
+        if self.shuffle:
+            rng.shuffle(batches)
+        return batches
+
+    def __iter__(self) -> Iterator[list[int]]:
+        yield from self.batches()
+
+    def __len__(self) -> int:
+        return len(self.batches())
+
+    def padding_report(self) -> dict[str, float]:
+        """Relleno con buckets frente a batches en orden de directorio.
+
+        `saved` es la fracción de frames procesados (y por tanto de FLOPs por
+        época) que se ahorra respecto al orden de directorio.
+        """
+        n = len(self.counts)
+        baseline = [
+            list(range(start, min(start + self.batch_size, n)))
+            for start in range(0, n, self.batch_size)
+        ]
+        base_processed, real = padded_frames(self.counts, baseline)
+        bucket_processed, _ = padded_frames(self.counts, self.batches())
+
+        return {
+            "baseline_padding": 1 - real / base_processed,
+            "bucketed_padding": 1 - real / bucket_processed,
+            "saved": 1 - bucket_processed / base_processed,
+            "batches": len(self.batches()),
+        }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Relleno temporal con y sin buckets por longitud")
+    parser.add_argument("--videos", required=True)
+    parser.add_argument("--manifest", required=True)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-padding", type=float, default=0.1)
+    parser.add_argument("--fps", type=int, default=16)
+
+    args = parser.parse_args()
+    sampler = BucketBatchSampler.from_batcher(
+        VideoBatcher(args.videos, args.batch_size),
+        FrameCountManifest(args.manifest, args.fps),
+        max_padding=args.max_padding,
+    )
+    report = sampler.padding_report()
+    print(f"relleno en orden de directorio: {report['baseline_padding']:.1%}")
+    print(f"relleno con buckets: {report['bucketed_padding']:.1%} en {report['batches']} batches")
+    print(f"frames procesados ahorrados por época: {report['saved']:.1%}")
@@ -0,0 +1,96 @@
+import hashlib
+from .load import np, os
+
+
+class FrameCache:
+    """Caché en disco de videos decodificados y redimensionados.
+
+    Cada entrada es un `.npy` uint8 `(T, H, W, 3)` indexado por ruta, mtime,
+    fps, tamaño destino y si se mezclaron frames al remuestrear. Un acierto
+    devuelve un `np.memmap` de solo lectura, sin decodificar ni copiar a RAM.
+    La fecha de modificación de cada entrada
+    marca su último uso y se expulsan las más antiguas al superar `max_bytes`.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 8 * 1024**3) -> None:
+        if max_bytes <= 0:
+            raise ValueError("El tamaño máximo de la caché debe ser mayor que 0")
+
+        os.makedirs(root, exist_ok=True)
+        self.root: str = root
+        self.max_bytes: int = max_bytes
+
+    @staticmethod
+    def key(path: str, fps: int, size: tuple[int, int], blend: bool = False) -> str:
+        mtime = os.stat(path).st_mtime_ns
+        raw = f"{os.path.abspath(path)}|{mtime}|{fps}|{size[0]}x{size[1]}"
+        if blend:
+            raw += "|blend"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.npy")
+
+    def _entries(self) -> list[os.DirEntry]:
+        return [
+            entry
+            for entry in os.scandir(self.root)
+            if entry.is_file() and entry.name.endswith(".npy")
+        ]
+
+    def nbytes(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def get(
+        self, path: str, fps: int, size: tuple[int, int], blend: bool = False
+    ) -> np.memmap | None:
+        file = self._file(FrameCache.key(path, fps, size, blend))
+        try:
+            video = np.load(file, mmap_mode="r")
+            os.utime(file)
+        except FileNotFoundError:
+            return None
+        return video
+
+    def put(
+        self,
+        path: str,
+        fps: int,
+        size: tuple[int, int],
+        video: np.ndarray,
+        blend: bool = False,
+    ) -> np.memmap:
+        key = FrameCache.key(path, fps, size, blend)
+        file = self._file(key)
+
+        # Escritura atómica: otro proceso nunca ve una entrada a medias
+        tmp = f"{file}.{os.getpid()}.tmp"
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.uint8, shape=video.shape)
+        out[...] = video
+        out.flush()
+        del out
+        os.replace(tmp, file)
+
+        self.evict(keep=key)
+        return np.load(file, mmap_mode="r")
+
+    def evict(self, keep: str | None = None) -> None:
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime_ns)
+        total = sum(entry.stat().st_size for entry in entries)
+
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.name == f"{keep}.npy":
+                continue
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+            except FileNotFoundError:
+                # Otro proceso ya la expulsó
+                pass
+
+    def clear(self) -> None:
+        for entry in self._entries():
+            os.remove(entry.path)
@@ -0,0 +1,194 @@
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+import math
+from torch.utils.data import DataLoader, Dataset, IterableDataset, get_worker_info
+from .load import np, torch, RGBVideoLoader, VideoBatcher
+
+T = TypeVar("T")
+Transform = Callable[[np.ndarray], np.ndarray]
+
+
+def collate_videos(videos: list[np.ndarray], paths: list[str]) -> dict[str, Any]:
+    """Apila videos `(T, H, W, 3)` de distinta longitud en un tensor uint8.
+
+    Igual que sliding_windows, los videos cortos se rellenan repitiendo su
+    último frame; `lengths` guarda la longitud real de cada uno.
+    """
+    lengths = [len(video) for video in videos]
+    (h, w, c) = videos[0].shape[1:]
+    batch = torch.empty((len(videos), max(lengths), h, w, c), dtype=torch.uint8)
+    out = batch.numpy()
+
+    for i, video in enumerate(videos):
+        out[i, : len(video)] = video
+        out[i, len(video) :] = video[-1]
+
+    return {
+        "videos": batch,
+        "lengths": torch.tensor(lengths, dtype=torch.int64),
+        "paths": paths,
+    }
+
+
+def shuffle_buffer(
+    items: Iterable[T], size: int, rng: np.random.Generator
+) -> Iterator[T]:
+    """Baraja un flujo con un buffer acotado de `size` elementos."""
+    buffer: list[T] = []
+    for item in items:
+        if len(buffer) < size:
+            buffer.append(item)
+            continue
+        j = int(rng.integers(size))
+        yield buffer[j]
+        buffer[j] = item
+
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+class VideoDataset(Dataset):
+    """Vista indexable de los videos de un VideoBatcher, para samplers de torch."""
+
+    def __init__(
+        self,
+        batcher: VideoBatcher,
+        loader: RGBVideoLoader,
+        transform: Transform | None = None,
+    ) -> None:
+        self.paths: list[str] = list(batcher.video_paths)
+        self.loader: RGBVideoLoader = loader
+        self.transform: Transform | None = transform
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, i: int) -> tuple[np.ndarray, str]:
+        video = self.loader._load_video(self.paths[i])
+        if self.transform is not None:
+            video = self.transform(video)
+        return video, self.paths[i]
+
+    @staticmethod
+    def collate(samples: list[tuple[np.ndarray, str]]) -> dict[str, Any]:
+        videos, paths = zip(*samples)
+        return collate_videos(list(videos), list(paths))
+
+
+class VideoIterableDataset(IterableDataset):
+    """Batches de un VideoBatcher repartidos entre los workers de un DataLoader.
+
+    Cada worker recibe los paths `i % num_workers == id`, sin duplicados, y los
+    baraja con un buffer de `shuffle_buffer` elementos sembrado con
+    `(seed, epoch, worker)`. Las decisiones del buffer no dependen del
+    contenido, así que guarda índices y decodifica cada video al emitirlo: el
+    orden es el mismo que con un buffer de videos y la memoria no crece.
+
+    `position` cuenta los batches ya consumidos en la época. Con el reparto
+    round-robin del DataLoader el batch global `k` sale del worker
+    `k % num_workers`; al reanudar, el DataLoader vuelve a empezar por el
+    worker 0, así que los papeles se rotan `position` puestos y cada worker
+    salta sus batches ya consumidos sin decodificarlos.
+    """
+
+    def __init__(
+        self,
+        batcher: VideoBatcher,
+        loader: RGBVideoLoader,
+        shuffle_buffer: int = 0,
+        seed: int = 0,
+        transform: Transform | None = None,
+        drop_last: bool = False,
+    ) -> None:
+        if shuffle_buffer < 0:
+            raise ValueError("El tamaño del buffer de barajado no puede ser negativo")
+
+        self.paths: list[str] = list(batcher.video_paths)
+        self.batch_size: int = batcher.batch_size
+        self.loader: RGBVideoLoader = loader
+        self.shuffle_buffer: int = shuffle_buffer
+        self.seed: int = seed
+        self.transform: Transform | None = transform
+        self.drop_last: bool = drop_last
+        self.epoch: int = 0
+        self.position: int = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+        self.position = 0
+
+    def state_dict(self) -> dict[str, int]:
+        return {"epoch": self.epoch, "position": self.position, "seed": self.seed}
+
+    def load_state_dict(self, state: dict[str, int]) -> None:
+        self.seed = state["seed"]
+        self.epoch = state["epoch"]
+        self.position = state["position"]
+
+    def _worker_batches(self, worker: int, workers: int) -> Iterator[list[int]]:
+        indices: Iterable[int] = range(worker, len(self.paths), workers)
+        if self.shuffle_buffer > 1:
+            rng = np.random.default_rng([self.seed, self.epoch, worker])
+            indices = shuffle_buffer(indices, self.shuffle_buffer, rng)
+
+        batch: list[int] = []
+        for i in indices:
+            batch.append(i)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+
+        if batch and not self.drop_last:
+            yield batch
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        info = get_worker_info()
+        (worker, workers) = (0, 1) if info is None else (info.id, info.num_workers)
+
+        worker = (worker + self.position) % workers
+        skip = max(math.ceil((self.position - worker) / workers), 0)
+        for k, batch in enumerate(self._worker_batches(worker, workers)):
+            if k < skip:
+                continue
+
+            videos = [self.loader._load_video(self.paths[i]) for i in batch]
+            if self.transform is not None:
+                videos = [self.transform(video) for video in videos]
+            yield collate_videos(videos, [self.paths[i] for i in batch])
+
+
+class VideoDataLoader(DataLoader):
+    """DataLoader de VideoIterableDataset que lleva la cuenta de batches para reanudar."""
+
+    def __init__(
+        self,
+        dataset: VideoIterableDataset,
+        workers: int = 0,
+        pin_memory: bool = False,
+        **kwargs,
+    ) -> None:
+        # Los workers persistentes conservarían una posición antigua del dataset
+        if kwargs.pop("persistent_workers", False):
+            raise ValueError(
+                "VideoDataLoader no admite persistent_workers: los workers guardarían "
+                "una posición antigua del dataset al reanudar"
+            )
+        super().__init__(
+            dataset,
+            batch_size=None,
+            num_workers=workers,
+            pin_memory=pin_memory,
+            persistent_workers=False,
+            **kwargs,
+        )
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for batch in super().__iter__():
+            self.dataset.position += 1
+            yield batch
+        self.dataset.set_epoch(self.dataset.epoch + 1)
+
+    def state_dict(self) -> dict[str, int]:
+        return self.dataset.state_dict()
+
+    def load_state_dict(self, state: dict[str, int]) -> None:
+        self.dataset.load_state_dict(state)
@@ -1,9 +1,34 @@
-from typing import override
+from typing import override, Callable, Iterator, Sequence, TYPE_CHECKING
+from collections import deque
 from enum import Enum
 import numpy as np
 import torch
 import cv2
 import os
+from .profile import span
+from .resample import FpsResampler
+from .windows import padded_indices
+
+if TYPE_CHECKING:
+    from .cache import FrameCache
+    from .shard import ShardReader
+
+
+# Reserva el buffer uint8 (T, H, W, 3) en el que se decodifica un video
+Allocator = Callable[[tuple[int, ...]], np.ndarray]
+
+# Extensiones de los videos que aceptan el loader y el batcher (sin distinguir mayúsculas)
+VIDEO_EXTENSIONS: tuple[str, ...] = (".mp4", ".mov")
+
+
+class _SourceFrame:
+    """Frame BGR leído del video y, si ya hizo falta, su versión RGB redimensionada."""
+
+    __slots__ = ("raw", "rgb")
+
+    def __init__(self, raw: np.ndarray) -> None:
+        self.raw: np.ndarray = raw
+        self.rgb: np.ndarray | None = None
 
 
 class VideoSrc(Enum):
@@ -12,22 +37,40 @@ class VideoSrc(Enum):
     Dir = 3
 
 
+class StreamUnit(Enum):
+    Frame = 1
+    Clip = 2
+    Video = 3
+
+
 class VideoBatcher:
     def __init__(self, dir: str, batch_size: int) -> None:
         if not os.path.isdir(dir):
             raise RuntimeError(f"{dir} no es un directorio")
 
+        self._set_paths(
+            [
+                os.path.join(dir, path)
+                for path in os.listdir(dir)
+                if os.path.exists(os.path.join(dir, path))
+                and RGBVideoLoader.is_video(path)
+            ],
+            batch_size,
+        )
+
+    @classmethod
+    def from_paths(cls, paths: list[str], batch_size: int) -> "VideoBatcher":
+        batcher = cls.__new__(cls)
+        batcher._set_paths(list(paths), batch_size)
+        return batcher
+
+    def _set_paths(self, video_paths: list[str], batch_size: int) -> None:
         if batch_size < 0:
             raise ValueError("El tamaño de batch debe ser mayor que 0")
 
         self.batch_size: int = batch_size
         self.current: int = 0
-
-        self.video_paths: list[str] = [
-            os.path.join(dir, path)
-            for path in os.listdir(dir)
-            if os.path.exists(os.path.join(dir, path)) and RGBVideoLoader.is_mp4(path)
-        ]
+        self.video_paths: list[str] = video_paths
 
         if batch_size > len(self.video_paths):
             raise ValueError(
@@ -50,9 +93,35 @@ class VideoBatcher:
 
 
 class RGBVideoLoader:
-    def __init__(self, fps: int = 16, size: tuple[int, int] = (224, 224)) -> None:
+    def __init__(
+        self,
+        fps: int = 16,
+        size: tuple[int, int] = (224, 224),
+        workers: int = 1,
+        cache: "FrameCache | None" = None,
+        shards: "ShardReader | None" = None,
+        blend: bool = False,
+    ) -> None:
+        if workers <= 0:
+            raise ValueError("El número de workers debe ser mayor que 0")
+
+        if shards is not None and shards.size != size:
+            raise ValueError(
+                f"Los shards guardan videos de {shards.size}, no de {size}"
+            )
+
+        if shards is not None and (shards.fps, shards.blend) != (fps, blend):
+            raise ValueError(
+                f"Los shards guardan videos a {shards.fps} fps (blend={shards.blend}), "
+                f"no a {fps} fps (blend={blend})"
+            )
+
         self.fps: int = fps
         self.size: tuple[int, int] = size
+        self.workers: int = workers
+        self.cache: "FrameCache | None" = cache
+        self.shards: "ShardReader | None" = shards
+        self.blend: bool = blend
         self.videos: list[np.ndarray]
         self.src: VideoSrc
 
@@ -61,38 +130,395 @@ class RGBVideoLoader:
         return f"RGBVideoLoader(fps={self.fps} size={self.size} videos=({len(self.videos)} {str(self.videos[0].shape).replace('(', ',').replace(')', '')}))"
 
     @staticmethod
-    def is_mp4(video: str) -> bool:
-        return video.endswith(".mp4")
+    def is_video(video: str) -> bool:
+        return video.lower().endswith(VIDEO_EXTENSIONS)
+
+    # Nombre anterior, de cuando solo se aceptaban mp4
+    is_mp4 = is_video
+
+    def _open(self, path: str) -> cv2.VideoCapture:
+        with span("open", path):
+            cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise RuntimeError(f"Hubo un error leyendo el video {path}")
+        return cap
 
-    def _load_video(self, path: str):
-        cap = cv2.VideoCapture(path)
+    def _source_fps(self, cap: cv2.VideoCapture) -> float:
         fps = cap.get(cv2.CAP_PROP_FPS)
-        if fps - self.fps > 1e-6:
-            raise RuntimeError(f"El video debe estar a {self.fps} fps")
+        return fps if fps > 0 else self.fps
 
-        ok, frame = cap.read()
+    def _convert(self, frame: np.ndarray, resized: np.ndarray, dst: np.ndarray) -> None:
+        with span("resize", nbytes=resized.nbytes, frames=1):
+            cv2.resize(src=frame, dsize=self.size, dst=resized, interpolation=cv2.INTER_AREA)
+        with span("cvtColor", nbytes=dst.nbytes, frames=1):
+            cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=dst)
 
-        if ok and len(frame) == 3 and frame.shape[-1] != 3:
-            cap.release()
-            raise RuntimeError(f"El video {path} no es RGB")
-        elif not ok:
-            cap.release()
-            raise RuntimeError(f"Hubo un error leyendo el video {path}")
+    def _rgb(
+        self,
+        source: _SourceFrame,
+        resized: np.ndarray,
+        dst: np.ndarray | None = None,
+        own: bool = True,
+    ) -> np.ndarray:
+        if source.rgb is None:
+            (w, h) = self.size
+            if dst is not None and own:
+                source.rgb = dst
+            else:
+                source.rgb = np.empty((h, w, 3), dtype=np.uint8)
+            self._convert(source.raw, resized, source.rgb)
+
+        if dst is None or dst is source.rgb:
+            return source.rgb
+
+        with span("copy", nbytes=dst.nbytes, frames=1):
+            dst[...] = source.rgb
+        return dst
+
+    def _write(
+        self,
+        previous: _SourceFrame | None,
+        current: _SourceFrame,
+        a: float,
+        resized: np.ndarray,
+        dst: np.ndarray,
+        own: bool = True,
+    ) -> None:
+        # Con own=True el frame convertido se queda en dst y los duplicados se copian de ahí
+        if previous is None or a >= 1.0:
+            self._rgb(current, resized, dst, own)
+        elif a <= 0.0:
+            self._rgb(previous, resized, dst, own)
+        else:
+            before = self._rgb(previous, resized)
+            after = self._rgb(current, resized)
+            with span("blend", nbytes=dst.nbytes, frames=1):
+                cv2.addWeighted(before, 1.0 - a, after, a, 0.0, dst=dst)
 
-        frames: list[np.ndarray] = [frame]
+    def _resampled(
+        self, cap: cv2.VideoCapture, path: str
+    ) -> Iterator[tuple[_SourceFrame | None, _SourceFrame, float]]:
+        resampler = FpsResampler(self._source_fps(cap), self.fps, self.blend)
+        previous: _SourceFrame | None = None
+        current: _SourceFrame | None = None
 
         while cap.isOpened():
-            ok, frame = cap.read()
+            # El buffer del frame de hace dos lecturas ya no se necesita
+            with span("read") as read:
+                ok, raw = cap.read(previous.raw if previous is not None else None)
+                if ok:
+                    read.add(raw.nbytes, 1)
 
             if not ok:
                 break
 
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = cv2.resize(src=frame, dsize=self.size, interpolation=cv2.INTER_AREA)
-            frames.append(frame)
+            if raw.ndim != 3 or raw.shape[-1] != 3:
+                raise RuntimeError(f"El video {path} no es RGB")
+
+            previous, current = current, _SourceFrame(raw)
+            ts = resampler.clock(cap.get(cv2.CAP_PROP_POS_MSEC))
+            for a in resampler.push(ts):
+                yield previous, current, a
+
+        if current is None:
+            raise RuntimeError(f"Hubo un error leyendo el video {path}")
+
+        for _ in range(resampler.flush()):
+            yield previous, current, 1.0
 
+    @staticmethod
+    def _grow(video: np.ndarray, n: int, alloc: Allocator) -> np.ndarray:
+        # El número de frames de la cabecera no era fiable: ampliamos un 50 %
+        grown = alloc((n + n // 2 + 1, *video.shape[1:]))
+        with span("copy", nbytes=video[:n].nbytes, frames=n):
+            grown[:n] = video[:n]
+        return grown
+
+    def _load_video(self, path: str, alloc: Allocator | None = None) -> np.ndarray:
+        with span("video", path) as total:
+            video = self._fetch_video(path, alloc)
+            total.add(video.nbytes, len(video))
+        return video
+
+    def _fetch_video(self, path: str, alloc: Allocator | None) -> np.ndarray:
+        if self.shards is not None and path in self.shards:
+            with span("shard") as read:
+                video = self.shards.get(path, alloc)
+                read.add(video.nbytes, len(video))
+            return video
+
+        if self.cache is None:
+            return self._decode_video(path, alloc)
+
+        with span("cache") as read:
+            cached = self.cache.get(path, self.fps, self.size, self.blend)
+            if cached is not None:
+                read.add(cached.nbytes, len(cached))
+        if cached is None:
+            decoded = self._decode_video(path)
+            with span("cache", nbytes=decoded.nbytes, frames=len(decoded)):
+                cached = self.cache.put(path, self.fps, self.size, decoded, self.blend)
+
+        if alloc is None:
+            return cached
+
+        video = alloc(cached.shape)
+        with span("copy", nbytes=video.nbytes, frames=len(video)):
+            video[...] = cached
+        return video
+
+    def _decode_video(self, path: str, alloc: Allocator | None = None) -> np.ndarray:
+        alloc = alloc or (lambda shape: np.empty(shape, dtype=np.uint8))
+        cap = self._open(path)
+        try:
+            (w, h) = self.size
+            probed = FpsResampler.expected(
+                max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 1),
+                self._source_fps(cap),
+                self.fps,
+            )
+            video = alloc((probed, h, w, 3))
+            resized = np.empty((h, w, 3), dtype=np.uint8)
+            n = 0
+
+            for previous, current, a in self._resampled(cap, path):
+                if n == len(video):
+                    video = RGBVideoLoader._grow(video, n, alloc)
+
+                self._write(previous, current, a, resized, video[n])
+                n += 1
+        finally:
+            cap.release()
+
+        return video[:n]
+
+    def _iter_frames(self, path: str) -> Iterator[np.ndarray]:
+        cap = self._open(path)
+        try:
+            (w, h) = self.size
+            resized = np.empty((h, w, 3), dtype=np.uint8)
+
+            for previous, current, a in self._resampled(cap, path):
+                frame = np.empty((h, w, 3), dtype=np.uint8)
+                self._write(previous, current, a, resized, frame, own=False)
+                yield frame
+        finally:
+            cap.release()
+
+    @staticmethod
+    def _skip_to(cap: cv2.VideoCapture, pos: int, idx: int, path: str) -> None:
+        # grab() avanza sin convertir el frame, más barato que read()
+        while pos < idx:
+            if not cap.grab():
+                raise RuntimeError(f"El video {path} no tiene el frame {idx}")
+            pos += 1
+
+    def load_frames(
+        self, path: str, indices: Sequence[int] | np.ndarray, seek_gap: int = 16
+    ) -> np.ndarray:
+        """Decodifica solo los frames `indices` de un video, en el orden pedido.
+
+        Los índices se refieren a los fps del loader; si el video tiene otros,
+        se toma el frame de origen más cercano (sin mezcla aunque haya `blend`).
+        Los saltos de más de `seek_gap` frames se hacen con un seek, que
+        OpenCV resuelve desde el keyframe anterior. Si la marca de tiempo del
+        frame leído no coincide con la pedida, el seek no es fiable para este
+        video y se vuelve a una lectura secuencial.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.size == 0 or indices.min() < 0:
+            raise ValueError("Los índices de frame deben ser no negativos")
+
+        cap = self._open(path)
+        try:
+            fps = self._source_fps(cap)
+            resample = abs(fps - self.fps) > 1e-2
+            # Se valida en frames del loader, antes de pasar a los del video
+            count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if count > 0:
+                available = FpsResampler.expected(count, fps, self.fps) if resample else count
+                if indices.max() >= available:
+                    raise RuntimeError(
+                        f"El video {path} no tiene el frame {indices.max()} "
+                        f"(tiene {available} a {self.fps} fps)"
+                    )
+
+            if resample:
+                indices = FpsResampler.source_indices(indices, fps, self.fps)
+                # La última salida puede caer en el periodo del último frame
+                if count > 0:
+                    indices = np.minimum(indices, count - 1)
+
+            wanted, order = np.unique(indices, return_inverse=True)
+            (w, h) = self.size
+            video = np.empty((len(wanted), h, w, 3), dtype=np.uint8)
+            resized = np.empty((h, w, 3), dtype=np.uint8)
+            frame = None
+            can_seek = cap.get(cv2.CAP_PROP_FPS) > 0
+            pos = 0
+
+            for i, idx in enumerate(wanted.tolist()):
+                seeked = can_seek and idx - pos > seek_gap
+                with span("seek"):
+                    if seeked:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+                    else:
+                        RGBVideoLoader._skip_to(cap, pos, idx, path)
+
+                with span("read") as read:
+                    ok, frame = cap.read(frame)
+                    if ok:
+                        read.add(frame.nbytes, 1)
+                if seeked and (
+                    not ok or round(cap.get(cv2.CAP_PROP_POS_MSEC) * fps / 1000) != idx
+                ):
+                    cap.release()
+                    cap = self._open(path)
+                    can_seek = False
+                    RGBVideoLoader._skip_to(cap, 0, idx, path)
+                    ok, frame = cap.read(frame)
+
+                if not ok:
+                    raise RuntimeError(f"El video {path} no tiene el frame {idx}")
+
+                self._convert(frame, resized, video[i])
+                pos = idx + 1
+        finally:
+            cap.release()
+
+        if np.array_equal(wanted, indices):
+            return video
+        return video[order]
+
+    def load_range(self, path: str, start: int, stop: int) -> np.ndarray:
+        if stop <= start:
+            raise ValueError("El intervalo de frames está vacío")
+        return self.load_frames(path, np.arange(start, stop))
+
+    def random_clip(
+        self, path: str, clip_len: int, rng: np.random.Generator | None = None
+    ) -> np.ndarray:
+        rng = rng or np.random.default_rng()
+        cap = self._open(path)
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = self._source_fps(cap)
         cap.release()
-        return np.array(frames)
+
+        if count <= 0:
+            raise RuntimeError(f"Hubo un error leyendo el video {path}")
+
+        count = FpsResampler.expected(count, fps, self.fps)
+
+        # Igual que sliding_windows: los videos cortos repiten el último frame
+        if count <= clip_len:
+            return self.load_frames(path, padded_indices(count, clip_len))
+
+        start = int(rng.integers(0, count - clip_len + 1))
+        return self.load_range(path, start, start + clip_len)
+
+    def _iter_clips(
+        self, path: str, clip_len: int, stride: int
+    ) -> Iterator[np.ndarray]:
+        window: deque[np.ndarray] = deque(maxlen=clip_len)
+        pending = 0
+        emitted = False
+
+        for frame in self._iter_frames(path):
+            window.append(frame)
+            pending += 1
+            if len(window) == clip_len and (not emitted or pending >= stride):
+                with span("stack", path, clip_len * frame.nbytes, clip_len):
+                    clip = np.stack(window)
+                yield clip
+                pending = 0
+                emitted = True
+
+        # Igual que sliding_windows: los videos cortos se rellenan con el último frame
+        if not emitted and window:
+            while len(window) < clip_len:
+                window.append(window[-1])
+            yield np.stack(window)
+
+    def _collect_video(self, path: str, max_bytes: int | None) -> np.ndarray:
+        frames: list[np.ndarray] = []
+        nbytes = 0
+
+        for frame in self._iter_frames(path):
+            nbytes += frame.nbytes
+            if max_bytes is not None and nbytes > max_bytes:
+                raise RuntimeError(
+                    f"El video {path} supera el límite de memoria de {max_bytes} bytes"
+                )
+            frames.append(frame)
+
+        with span("stack", path, nbytes, len(frames)):
+            return np.stack(frames)
+
+    def stream(
+        self,
+        path: str,
+        unit: StreamUnit = StreamUnit.Video,
+        clip_len: int = 16,
+        stride: int | None = None,
+        max_bytes: int | None = None,
+    ) -> Iterator[np.ndarray]:
+        """Recorre los videos de `path` sin mantenerlos todos en memoria.
+
+        Según `unit` se entregan frames `(H, W, 3)`, clips `(clip_len, H, W, 3)`
+        o videos completos `(T, H, W, 3)`. `max_bytes` acota los frames
+        decodificados que el generador retiene a la vez.
+        """
+        if not os.path.exists(path):
+            raise RuntimeError(f"No exite {path}")
+
+        if clip_len <= 0:
+            raise ValueError("La longitud del clip debe ser mayor que 0")
+
+        stride = clip_len if stride is None else stride
+        if stride <= 0:
+            raise ValueError("El stride debe ser mayor que 0")
+
+        if max_bytes is not None:
+            (w, h) = self.size
+            held = {
+                StreamUnit.Frame: 1,
+                StreamUnit.Clip: clip_len,
+                StreamUnit.Video: 1,
+            }[unit] * h * w * 3
+            if held > max_bytes:
+                raise ValueError(
+                    f"El límite de memoria ({max_bytes} bytes) no admite una unidad de {held} bytes"
+                )
+
+        video_paths = (
+            sorted(
+                os.path.join(path, f)
+                for f in os.listdir(path)
+                if RGBVideoLoader.is_video(f)
+            )
+            if os.path.isdir(path)
+            else [path]
+        )
+
+        for video_path in video_paths:
+            match unit:
+                case StreamUnit.Frame:
+                    yield from self._iter_frames(video_path)
+                case StreamUnit.Clip:
+                    yield from self._iter_clips(video_path, clip_len, stride)
+                case StreamUnit.Video:
+                    yield self._collect_video(video_path, max_bytes)
+
+    def _load_videos(self, paths: list[str]) -> list[np.ndarray]:
+        if self.workers == 1 or len(paths) <= 1:
+            return [self._load_video(video_path) for video_path in paths]
+
+        from .parallel import ParallelDecoder
+
+        with ParallelDecoder(
+            self.fps, self.size, self.workers, self.cache, self.shards, self.blend
+        ) as decoder:
+            return decoder.decode(paths).videos
 
     def load(self, path: str):
         if not os.path.exists(path):
@@ -104,21 +530,23 @@ class RGBVideoLoader:
                 video_paths = [
                     os.path.join(path, f)
                     for f in os.listdir(path)
-                    if RGBVideoLoader.is_mp4(f)
-                ]
-                self.videos = [
-                    self._load_video(video_path) for video_path in video_paths
+                    if RGBVideoLoader.is_video(f)
                 ]
+                self.videos = self._load_videos(video_paths)
             case VideoSrc.Video:
                 self.videos = [self._load_video(path)]
 
     def load_batch(self, paths: list[str]) -> np.ndarray | None:
         mask: np.ndarray = np.array(
-            [os.path.exists(path) and RGBVideoLoader.is_mp4(path) for path in paths],
+            [
+                (self.shards is not None and path in self.shards)
+                or (os.path.exists(path) and RGBVideoLoader.is_video(path))
+                for path in paths
+            ],
             dtype=bool,
         )
         if not np.all(mask):
-            raise RuntimeError("Algunos paths no existen o no son .mp4")
+            raise RuntimeError(f"Algunos paths no existen o no son videos {VIDEO_EXTENSIONS}")
 
         self.src = VideoSrc.VideoBatch
-        self.videos = [self._load_video(video_path) for video_path in paths]
+        self.videos = self._load_videos(paths)
@@ -0,0 +1,328 @@
+from argparse import ArgumentParser
+import hashlib
+import json
+from .load import np, os, RGBVideoLoader
+from .aug import ClipKernel, Compose, VideoAugmentator
+
+# Nombre de cada transformación en la política y su kernel por clip
+TRANSFORMS: dict[str, ClipKernel] = {
+    "blur": VideoAugmentator.BlurClip,
+    "noise": VideoAugmentator.RandomNoiseClip,
+    "field": VideoAugmentator.NoiseFieldClip,
+    "brightness": VideoAugmentator.BrightnessContrastClip,
+    "warp": VideoAugmentator.WarpAffineClip,
+    "resize": VideoAugmentator.RandomResizeClip,
+}
+
+
+def video_key(path: str) -> int:
+    """Clave estable de un video para sembrar sus aumentos, independiente del orden."""
+    return int.from_bytes(hashlib.sha1(os.path.abspath(path).encode()).digest()[:8])
+
+
+class AugmentationPolicy:
+    """Transformaciones encadenadas, copias por clip y semilla de un aumento offline."""
+
+    def __init__(self, transforms: list[str], copies: int = 1, seed: int = 0) -> None:
+        unknown = [name for name in transforms if name not in TRANSFORMS]
+        if unknown or not transforms:
+            raise ValueError(
+                f"Transformaciones no válidas: {unknown}; opciones: {list(TRANSFORMS)}"
+            )
+
+        if copies <= 0:
+            raise ValueError("El número de copias debe ser mayor que 0")
+
+        self.transforms: list[str] = list(transforms)
+        self.copies: int = copies
+        self.seed: int = seed
+
+    def to_dict(self) -> dict:
+        return {"transforms": self.transforms, "copies": self.copies, "seed": self.seed}
+
+    def kernel(self) -> Compose:
+        return Compose(*(TRANSFORMS[name] for name in self.transforms))
+
+    def version(self, fps: int, size: tuple[int, int], blend: bool = False) -> str:
+        # Como en la clave de FrameCache, blend solo cuenta si está activado
+        extra = {"blend": True} if blend else {}
+        raw = json.dumps(
+            {**self.to_dict(), "fps": fps, "size": list(size), **extra}, sort_keys=True
+        )
+        return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+    def rng(self, path: str, copy: int) -> np.random.Generator:
+        # La misma semilla que usa ParallelAugmentor con la clave del video
+        return np.random.default_rng((self.seed, video_key(path), copy))
+
+
+class AugmentedStore:
+    """Clips aumentados de una política, en chunks `.npy` bajo `root/<versión>/`.
+
+    `manifest.json` guarda la política y, por cada clip, su video de origen
+    (ruta y mtime), la copia, el chunk y el rango de frames que ocupa. Los
+    chunks `.npy` se abren como memmap; con `compress` se guardan en `.npz` y
+    se leen descomprimidos. Solo se apunta en el manifest lo que ya está en
+    disco, así que una ejecución interrumpida continúa desde el último chunk.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        policy: AugmentationPolicy,
+        fps: int = 16,
+        size: tuple[int, int] = (224, 224),
+        compress: bool = False,
+        blend: bool = False,
+    ) -> None:
+        self.policy: AugmentationPolicy = policy
+        self.fps: int = fps
+        self.size: tuple[int, int] = size
+        self.blend: bool = blend
+        self.root: str = os.path.join(root, policy.version(fps, size, blend))
+        self._manifest_path: str = os.path.join(self.root, "manifest.json")
+
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path) as f:
+                manifest = json.load(f)
+            self.compress: bool = manifest["compress"]
+            self.chunks: list[str] = manifest["chunks"]
+            self.entries: list[dict] = manifest["entries"]
+        else:
+            os.makedirs(self.root, exist_ok=True)
+            self.compress = compress
+            self.chunks = []
+            self.entries = []
+
+        self._loaded: dict[int, np.ndarray] = {}
+
+    @classmethod
+    def open(cls, path: str) -> "AugmentedStore":
+        """Abre una versión ya escrita a partir de su directorio."""
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        store = cls(
+            os.path.dirname(os.path.abspath(path)),
+            AugmentationPolicy(**manifest["policy"]),
+            manifest["fps"],
+            tuple(manifest["size"]),
+            blend=manifest.get("blend", False),
+        )
+        if store.root != os.path.abspath(path):
+            raise RuntimeError(f"{path} no corresponde a la política de su manifest")
+        return store
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        entry = self.entries[i]
+        chunk = self._chunk(entry["chunk"])
+        return chunk[entry["start"] : entry["start"] + entry["frames"]]
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.abspath(path) in self._done()
+
+    @property
+    def paths(self) -> list[str]:
+        return [entry["path"] for entry in self.entries]
+
+    def copies(self, path: str) -> list[np.ndarray]:
+        path = os.path.abspath(path)
+        return [self[i] for i, entry in enumerate(self.entries) if entry["path"] == path]
+
+    def _chunk(self, i: int) -> np.ndarray:
+        if i not in self._loaded:
+            file = os.path.join(self.root, self.chunks[i])
+            if self.compress:
+                # Descomprimido ocupa un chunk entero en RAM: solo se guarda el último
+                with np.load(file) as data:
+                    self._loaded = {i: data["frames"]}
+            else:
+                self._loaded[i] = np.load(file, mmap_mode="r")
+        return self._loaded[i]
+
+    def _done(self) -> dict[str, int]:
+        """mtime de cada video ya materializado con todas sus copias."""
+        counts: dict[str, int] = {}
+        mtimes: dict[str, int] = {}
+        for entry in self.entries:
+            counts[entry["path"]] = counts.get(entry["path"], 0) + 1
+            mtimes[entry["path"]] = entry["mtime"]
+        return {
+            path: mtime
+            for path, mtime in mtimes.items()
+            if counts[path] == self.policy.copies
+        }
+
+    def _save_manifest(self) -> None:
+        manifest = {
+            "policy": self.policy.to_dict(),
+            "fps": self.fps,
+            "size": list(self.size),
+            "blend": self.blend,
+            "compress": self.compress,
+            "chunks": self.chunks,
+            "entries": self.entries,
+        }
+        tmp = f"{self._manifest_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._manifest_path)
+
+    def _flush(self, clips: list[np.ndarray], entries: list[dict]) -> None:
+        name = f"chunk-{len(self.chunks):05d}.{'npz' if self.compress else 'npy'}"
+        file = os.path.join(self.root, name)
+        frames = np.concatenate(clips)
+
+        # Un chunk a medias de una ejecución interrumpida se sobrescribe
+        tmp = f"{file}.tmp"
+        with open(tmp, "wb") as f:
+            if self.compress:
+                np.savez_compressed(f, frames=frames)
+            else:
+                np.save(f, frames)
+        os.replace(tmp, file)
+
+        start = 0
+        for entry, clip in zip(entries, clips):
+            entry.update(chunk=len(self.chunks), start=start, frames=len(clip))
+            start += len(clip)
+        self.chunks.append(name)
+        self.entries.extend(entries)
+        self._save_manifest()
+
+    def materialize(
+        self,
+        paths: list[str],
+        loader: RGBVideoLoader,
+        chunk_bytes: int = 256 * 1024**2,
+        workers: int = 1,
+    ) -> int:
+        """Aumenta los videos que faltan y devuelve cuántos clips se escribieron.
+
+        Un video ya materializado se vuelve a procesar solo si cambió su mtime;
+        sus copias antiguas quedan en sus chunks pero salen del manifest.
+        """
+        if (loader.fps, loader.size, loader.blend) != (self.fps, self.size, self.blend):
+            raise ValueError(
+                f"El loader produce {loader.fps} fps y {loader.size} (blend={loader.blend}), "
+                f"la versión espera {self.fps} fps y {self.size} (blend={self.blend})"
+            )
+
+        done = self._done()
+        pending = [
+            os.path.abspath(path)
+            for path in paths
+            if done.get(os.path.abspath(path)) != os.stat(path).st_mtime_ns
+        ]
+        stale = set(pending)
+        self.entries = [entry for entry in self.entries if entry["path"] not in stale]
+
+        augmentor = None
+        if workers > 1:
+            from .parallel import ParallelAugmentor
+
+            augmentor = ParallelAugmentor(
+                self.policy.kernel(), self.policy.copies, workers, self.policy.seed
+            )
+
+        kernel = self.policy.kernel()
+        clips: list[np.ndarray] = []
+        entries: list[dict] = []
+        nbytes = 0
+        written = 0
+
+        # Con el pool se aumentan juntos hasta `workers` videos (o chunk_bytes)
+        # para que todos los workers tengan trabajo
+        group: list[tuple[str, int, np.ndarray]] = []
+        group_bytes = 0
+
+        def augment_group() -> None:
+            nonlocal nbytes
+            if augmentor is not None:
+                videos = [video for _, _, video in group]
+                keys = [video_key(path) for path, _, _ in group]
+                with augmentor.augment(videos, keys) as batch:
+                    augmented = [clip.copy() for clip in batch.videos]
+            else:
+                augmented = [
+                    kernel(video, self.policy.rng(path, copy))
+                    for path, _, video in group
+                    for copy in range(self.policy.copies)
+                ]
+
+            # augmented[i * copies + c] es la copia c del video i
+            for i, clip in enumerate(augmented):
+                path, mtime, _ = group[i // self.policy.copies]
+                clips.append(clip)
+                entries.append(
+                    {"path": path, "mtime": mtime, "copy": i % self.policy.copies}
+                )
+                nbytes += clip.nbytes
+            group.clear()
+
+        try:
+            for n, path in enumerate(pending):
+                video = loader._load_video(path)
+                group.append((path, os.stat(path).st_mtime_ns, video))
+                group_bytes += video.nbytes
+
+                if (
+                    augmentor is None
+                    or len(group) >= workers
+                    or group_bytes >= chunk_bytes
+                    or n == len(pending) - 1
+                ):
+                    augment_group()
+                    group_bytes = 0
+
+                if nbytes >= chunk_bytes:
+                    self._flush(clips, entries)
+                    written += len(clips)
+                    clips, entries, nbytes = [], [], 0
+
+            if clips:
+                self._flush(clips, entries)
+                written += len(clips)
+            elif stale:
+                self._save_manifest()
+        finally:
+            if augmentor is not None:
+                augmentor.close()
+
+        return written
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Materializa aumentos de video en disco")
+    parser.add_argument("--videos", required=True)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--transforms", nargs="+", required=True, choices=list(TRANSFORMS))
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compress", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-bytes", type=int, default=256 * 1024**2)
+    parser.add_argument("--fps", type=int, default=16)
+    parser.add_argument("--size", type=int, nargs=2, default=(224, 224))
+    parser.add_argument("--blend", action="store_true")
+
+    args = parser.parse_args()
+    loader = RGBVideoLoader(fps=args.fps, size=tuple(args.size), blend=args.blend)
+    store = AugmentedStore(
+        args.out,
+        AugmentationPolicy(args.transforms, args.copies, args.seed),
+        loader.fps,
+        loader.size,
+        args.compress,
+        loader.blend,
+    )
+    paths = sorted(
+        os.path.join(args.videos, f)
+        for f in os.listdir(args.videos)
+        if RGBVideoLoader.is_video(f)
+    )
+
+    written = store.materialize(paths, loader, args.chunk_bytes, args.workers)
+    print(f"{written} clips nuevos, {len(store)} en total en {store.root}")
@@ -0,0 +1,361 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from collections import deque
+from itertools import islice
+import math
+import traceback
+from typing import Iterator, Sequence
+from .load import np, os, RGBVideoLoader, VideoBatcher
+from .aug import ClipKernel
+from .cache import FrameCache
+from .shard import ShardReader
+
+# Cada proceso del pool crea su propio loader (o kernel) una sola vez
+_worker_loader: RGBVideoLoader
+_worker_kernel: ClipKernel
+
+# Aumento de un clip: (segmento, offset) de origen y destino, forma y claves de semilla
+_AugmentTask = tuple[str, int, str, int, tuple[int, ...], tuple[int, ...]]
+
+
+def _init_worker(
+    fps: int,
+    size: tuple[int, int],
+    cache: FrameCache | None,
+    shards: ShardReader | None,
+    blend: bool,
+) -> None:
+    global _worker_loader
+    _worker_loader = RGBVideoLoader(
+        fps=fps, size=size, cache=cache, shards=shards, blend=blend
+    )
+
+
+def _release(shm: SharedMemory) -> None:
+    """Cierra y borra un segmento del worker.
+
+    Si quedan vistas vivas (las del traceback de un error de decodificación,
+    por ejemplo) `close` lanza BufferError: el nombre se borra igualmente y
+    el mapeo se libera al morir la última vista.
+    """
+    try:
+        shm.close()
+    except BufferError:
+        pass
+    shm.unlink()
+
+
+def _decode(path: str) -> tuple[str, tuple[int, ...], str]:
+    segments: list[SharedMemory] = []
+
+    def alloc(shape: tuple[int, ...]) -> np.ndarray:
+        # track=False: el segmento lo libera el proceso principal, no el resource tracker del worker
+        shm = SharedMemory(create=True, size=max(math.prod(shape), 1), track=False)
+        segments.append(shm)
+        return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+    try:
+        video = _worker_loader._load_video(path, alloc)
+        shape, dtype = video.shape, video.dtype.str
+        del video
+    except BaseException as error:
+        # Los frames del traceback aún guardan vistas sobre los segmentos
+        traceback.clear_frames(error.__traceback__)
+        for shm in segments:
+            _release(shm)
+        raise
+
+    # El video se decodifica directamente en el último segmento reservado
+    *stale, shm = segments
+    for old in stale:
+        _release(old)
+    shm.close()
+    return shm.name, shape, dtype
+
+
+class _Segment:
+    """Segmento compartido que sirve de `base` a los arrays construidos sobre él.
+
+    numpy no retiene el buffer del mmap, así que cerrarlo con vistas vivas
+    corrompería memoria: el segmento se cierra solo cuando muere la última vista.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._shm: SharedMemory = SharedMemory(name=name, track=False)
+        # El nombre ya no hace falta: la memoria vive mientras siga mapeada
+        self._shm.unlink()
+
+    def __buffer__(self, flags: int) -> memoryview:
+        return self._shm.buf
+
+
+class SharedBatch:
+    """Videos decodificados por el pool, respaldados por memoria compartida.
+
+    Los arrays de `videos` son vistas sobre los segmentos compartidos, que se
+    liberan cuando se cierra el batch y no queda ninguna vista viva.
+    """
+
+    def __init__(
+        self, paths: list[str], results: list[tuple[str, tuple[int, ...], str]]
+    ) -> None:
+        self.paths: list[str] = paths
+        self.videos: list[np.ndarray] = [
+            np.ndarray(shape, dtype=np.dtype(dtype), buffer=_Segment(name))
+            for name, shape, dtype in results
+        ]
+
+    def __len__(self) -> int:
+        return len(self.videos)
+
+    def __enter__(self) -> "SharedBatch":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.videos = []
+
+
+class ParallelDecoder:
+    def __init__(
+        self,
+        fps: int = 16,
+        size: tuple[int, int] = (224, 224),
+        workers: int | None = None,
+        cache: FrameCache | None = None,
+        shards: ShardReader | None = None,
+        blend: bool = False,
+    ) -> None:
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 0:
+            raise ValueError("El número de workers debe ser mayor que 0")
+
+        self.workers: int = workers
+        self._pool: ProcessPoolExecutor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(fps, size, cache, shards, blend),
+        )
+        self._pending: set[Future] = set()
+
+    def __enter__(self) -> "ParallelDecoder":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def submit(self, paths: list[str]) -> list[Future]:
+        futures = [self._pool.submit(_decode, path) for path in paths]
+        self._pending.update(futures)
+        return futures
+
+    def collect(self, paths: list[str], futures: list[Future]) -> SharedBatch:
+        # Si algún video falla, el resto de segmentos se libera en close()
+        results = [future.result() for future in futures]
+        self._pending.difference_update(futures)
+        return SharedBatch(paths, results)
+
+    def decode(self, paths: list[str]) -> SharedBatch:
+        return self.collect(paths, self.submit(paths))
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+        # Libera los segmentos de resultados que nadie llegó a recoger
+        for future in self._pending:
+            if future.cancelled() or future.exception() is not None:
+                continue
+            name, _, _ = future.result()
+            _Segment(name)
+        self._pending.clear()
+
+
+class PrefetchBatcher:
+    """Decodifica en segundo plano los `prefetch` batches siguientes de un VideoBatcher."""
+
+    def __init__(
+        self, batcher: VideoBatcher, decoder: ParallelDecoder, prefetch: int = 2
+    ) -> None:
+        if prefetch <= 0:
+            raise ValueError("El número de batches precargados debe ser mayor que 0")
+
+        self.batcher: VideoBatcher = batcher
+        self.decoder: ParallelDecoder = decoder
+        self.prefetch: int = prefetch
+
+    def __iter__(self) -> Iterator[SharedBatch]:
+        batches = iter(self.batcher)
+        inflight: deque[tuple[list[str], list[Future]]] = deque(
+            (paths, self.decoder.submit(paths))
+            for paths in islice(batches, self.prefetch)
+        )
+
+        while inflight:
+            paths, futures = inflight.popleft()
+            following = next(batches, None)
+            if following is not None:
+                inflight.append((following, self.decoder.submit(following)))
+            yield self.decoder.collect(paths, futures)
+
+
+def _init_augmentor(kernel: ClipKernel) -> None:
+    global _worker_kernel
+    _worker_kernel = kernel
+
+
+def _augment_into(
+    src: memoryview,
+    src_offset: int,
+    dst: memoryview,
+    dst_offset: int,
+    shape: tuple[int, ...],
+    key: tuple[int, ...],
+) -> None:
+    video = np.ndarray(shape, dtype=np.uint8, buffer=src, offset=src_offset)
+    out = np.ndarray(shape, dtype=np.uint8, buffer=dst, offset=dst_offset)
+    _worker_kernel(video, np.random.default_rng(key), out=out)
+
+
+def _augment(task: _AugmentTask) -> None:
+    src_name, src_offset, dst_name, dst_offset, shape, key = task
+    src = SharedMemory(name=src_name, track=False)
+    dst = SharedMemory(name=dst_name, track=False)
+    failure: str | None = None
+    try:
+        _augment_into(src.buf, src_offset, dst.buf, dst_offset, shape, key)
+    except Exception as error:
+        # El traceback retiene las vistas sobre los segmentos y no dejaría cerrarlos
+        failure = f"{type(error).__name__}: {error}"
+
+    src.close()
+    dst.close()
+    if failure is not None:
+        raise RuntimeError(f"Falló el aumento del clip {key}: {failure}")
+
+
+class AugmentedBatch:
+    """Clips aumentados por el pool, en un único segmento compartido.
+
+    `videos[i * copies + c]` es la copia `c` del clip `i`; `keys` guarda la
+    clave con la que se sembró cada uno.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        shapes: list[tuple[int, ...]],
+        offsets: list[int],
+        keys: list[tuple[int, ...]],
+    ) -> None:
+        segment = _Segment(name)
+        self.keys: list[tuple[int, ...]] = keys
+        self.videos: list[np.ndarray] = [
+            np.ndarray(shape, dtype=np.uint8, buffer=segment, offset=offset)
+            for shape, offset in zip(shapes, offsets)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.videos)
+
+    def __enter__(self) -> "AugmentedBatch":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.videos = []
+
+
+class ParallelAugmentor:
+    """Aplica un kernel por clip en un pool de procesos sobre memoria compartida.
+
+    Los clips de origen se copian una vez a un segmento compartido y cada
+    worker escribe su resultado en un hueco ya reservado del segmento de
+    salida, sin devolver arrays por pickle. El generador de cada copia se
+    siembra con `(seed, clave del clip, copia)`: el resultado es el mismo con
+    cualquier número de workers. El kernel debe admitir `out`, como los
+    métodos `*Clip` de VideoAugmentator y Compose.
+    """
+
+    def __init__(
+        self,
+        kernel: ClipKernel,
+        copies: int = 1,
+        workers: int | None = None,
+        seed: int = 0,
+    ) -> None:
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 0:
+            raise ValueError("El número de workers debe ser mayor que 0")
+
+        if copies <= 0:
+            raise ValueError("El número de copias debe ser mayor que 0")
+
+        self.copies: int = copies
+        self.workers: int = workers
+        self.seed: int = seed
+        self._pool: ProcessPoolExecutor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_augmentor, initargs=(kernel,)
+        )
+
+    def __enter__(self) -> "ParallelAugmentor":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def augment(
+        self, videos: Sequence[np.ndarray], keys: Sequence[int] | None = None
+    ) -> AugmentedBatch:
+        keys = range(len(videos)) if keys is None else keys
+        if len(keys) != len(videos):
+            raise ValueError("Hace falta una clave por video")
+
+        src_offsets = np.cumsum([0] + [video.nbytes for video in videos]).tolist()
+        shapes = [video.shape for video in videos for _ in range(self.copies)]
+        dst_offsets = np.cumsum([0] + [math.prod(shape) for shape in shapes]).tolist()
+        seeds = [
+            (self.seed, int(key), copy) for key in keys for copy in range(self.copies)
+        ]
+
+        src = SharedMemory(create=True, size=max(src_offsets[-1], 1), track=False)
+        dst = SharedMemory(create=True, size=max(dst_offsets[-1], 1), track=False)
+        try:
+            for video, offset in zip(videos, src_offsets):
+                view = np.ndarray(video.shape, dtype=np.uint8, buffer=src.buf, offset=offset)
+                view[...] = video
+                del view
+
+            tasks = [
+                (
+                    src.name,
+                    src_offsets[i // self.copies],
+                    dst.name,
+                    dst_offsets[i],
+                    shapes[i],
+                    seeds[i],
+                )
+                for i in range(len(shapes))
+            ]
+            chunksize = max(len(tasks) // (4 * self.workers), 1)
+            for _ in self._pool.map(_augment, tasks, chunksize=chunksize):
+                pass
+
+            return AugmentedBatch(dst.name, shapes, dst_offsets[:-1], seeds)
+        finally:
+            src.close()
+            src.unlink()
+            # AugmentedBatch ya tiene su propio mapeo y desenlazó el nombre
+            dst.close()
+            try:
+                dst.unlink()
+            except FileNotFoundError:
+                pass
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
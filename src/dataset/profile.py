@@ -0,0 +1,222 @@
+from typing import Iterator
+from argparse import ArgumentParser
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+
+class _NullSpan:
+    """Span que no mide nada: es lo que se devuelve con el perfilado apagado."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *_) -> None:
+        pass
+
+    def add(self, nbytes: int = 0, frames: int = 0) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """Tramo medido de una etapa: tiempo de pared, bytes y frames producidos."""
+
+    __slots__ = ("profiler", "stage", "video", "start", "nbytes", "frames", "_outer")
+
+    def __init__(
+        self,
+        profiler: "Profiler",
+        stage: str,
+        video: str | None,
+        nbytes: int,
+        frames: int,
+    ) -> None:
+        self.profiler: Profiler = profiler
+        self.stage: str = stage
+        self.video: str | None = video
+        self.nbytes: int = nbytes
+        self.frames: int = frames
+        self.start: int = 0
+        self._outer: str | None = None
+
+    def add(self, nbytes: int = 0, frames: int = 0) -> None:
+        self.nbytes += nbytes
+        self.frames += frames
+
+    def __enter__(self) -> "Span":
+        # Las etapas internas heredan el video del span que las contiene
+        self._outer = self.profiler.video
+        if self.video is None:
+            self.video = self._outer
+        else:
+            self.profiler.video = self.video
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *_) -> None:
+        end = time.perf_counter_ns()
+        self.profiler.video = self._outer
+        self.profiler.events.append(
+            (
+                self.stage,
+                self.video or "",
+                self.start,
+                end - self.start,
+                self.nbytes,
+                self.frames,
+                threading.get_ident(),
+            )
+        )
+
+
+class Profiler:
+    """Registro de etapas del loader, con resumen en tabla y traza de Chrome.
+
+    Cada evento es `(etapa, video, inicio_ns, duración_ns, bytes, frames, hilo)`.
+    La etapa `video` envuelve la carga completa de un video, de modo que la
+    diferencia con la suma de las demás etapas es tiempo no instrumentado.
+    Solo se registra el proceso actual: con `workers > 1` la decodificación
+    ocurre en otros procesos.
+    """
+
+    def __init__(self) -> None:
+        self.events: list[tuple[str, str, int, int, int, int, int]] = []
+        self.video: str | None = None
+
+    def span(
+        self, stage: str, video: str | None = None, nbytes: int = 0, frames: int = 0
+    ) -> Span:
+        return Span(self, stage, video, nbytes, frames)
+
+    def clear(self) -> None:
+        self.events = []
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        stages: dict[str, dict[str, float]] = {}
+        for stage, _, _, duration, nbytes, frames, _ in self.events:
+            total = stages.setdefault(
+                stage, {"calls": 0, "seconds": 0.0, "bytes": 0, "frames": 0}
+            )
+            total["calls"] += 1
+            total["seconds"] += duration / 1e9
+            total["bytes"] += nbytes
+            total["frames"] += frames
+        return stages
+
+    def per_video(self) -> dict[str, dict[str, float]]:
+        """Segundos por etapa de cada video."""
+        videos: dict[str, dict[str, float]] = {}
+        for stage, video, _, duration, _, _, _ in self.events:
+            stages = videos.setdefault(video, {})
+            stages[stage] = stages.get(stage, 0.0) + duration / 1e9
+        return videos
+
+    def table(self) -> str:
+        stages = self.summary()
+        total = stages.get("video", {}).get("seconds") or sum(
+            stage["seconds"] for stage in stages.values()
+        )
+
+        lines = [
+            f"{'etapa':<12}{'llamadas':>10}{'s':>10}{'%':>8}{'MB':>10}{'frames':>10}{'MB/s':>10}"
+        ]
+        for name, stage in sorted(stages.items(), key=lambda item: -item[1]["seconds"]):
+            mb = stage["bytes"] / 1024**2
+            lines.append(
+                f"{name:<12}{stage['calls']:>10}{stage['seconds']:>10.3f}"
+                f"{100 * stage['seconds'] / total if total else 0:>8.1f}"
+                f"{mb:>10.1f}{stage['frames']:>10}"
+                f"{mb / stage['seconds'] if stage['seconds'] else 0:>10.1f}"
+            )
+        return "\n".join(lines)
+
+    def chrome_trace(self, path: str) -> None:
+        """Escribe los eventos en el formato de chrome://tracing y Perfetto."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": stage,
+                "cat": "loader",
+                "ph": "X",
+                "ts": start / 1e3,
+                "dur": duration / 1e3,
+                "pid": pid,
+                "tid": tid,
+                "args": {"video": video, "bytes": nbytes, "frames": frames},
+            }
+            for stage, video, start, duration, nbytes, frames, tid in self.events
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+# Perfilador activo del proceso; con None cada span cuesta una comprobación
+_active: Profiler | None = None
+
+
+def span(
+    stage: str, video: str | None = None, nbytes: int = 0, frames: int = 0
+) -> Span | _NullSpan:
+    if _active is None:
+        return _NULL_SPAN
+    return _active.span(stage, video, nbytes, frames)
+
+
+def enable(profiler: Profiler | None = None) -> Profiler:
+    global _active
+    _active = profiler or Profiler()
+    return _active
+
+
+def disable() -> None:
+    global _active
+    _active = None
+
+
+@contextmanager
+def profiling(profiler: Profiler | None = None) -> Iterator[Profiler]:
+    previous = _active
+    try:
+        yield enable(profiler)
+    finally:
+        if previous is None:
+            disable()
+        else:
+            enable(previous)
+
+
+if __name__ == "__main__":
+    from .load import RGBVideoLoader
+
+    # El loader ve este módulo como dataset.profile, no como __main__
+    from .profile import profiling
+
+    parser = ArgumentParser(description="Tiempo por etapa del loader de videos")
+    parser.add_argument("--videos", required=True)
+    parser.add_argument("--trace")
+    parser.add_argument("--fps", type=int, default=16)
+    parser.add_argument("--size", type=int, nargs=2, default=(224, 224))
+
+    args = parser.parse_args()
+    loader = RGBVideoLoader(fps=args.fps, size=tuple(args.size))
+    paths = sorted(
+        os.path.join(args.videos, f)
+        for f in os.listdir(args.videos)
+        if RGBVideoLoader.is_video(f)
+    )
+
+    with profiling() as profiler:
+        for path in paths:
+            loader._load_video(path)
+
+    print(profiler.table())
+    if args.trace:
+        profiler.chrome_trace(args.trace)
+        print(f"Traza guardada en {args.trace}")
@@ -0,0 +1,80 @@
+import math
+import numpy as np
+
+
+class FpsResampler:
+    """Remuestreo temporal por marcas de tiempo, sin reescribir el video.
+
+    El frame de salida `k` corresponde al instante `k / dst_fps`. Por cada
+    frame de entrada, `push` devuelve el peso `a` del frame actual para cada
+    salida que cae entre el frame anterior y el actual: la salida es
+    `(1 - a) * anterior + a * actual`. Sin `blend` el peso es 0 o 1, es decir,
+    se elige el frame más cercano, repitiendo o descartando frames.
+    """
+
+    def __init__(self, src_fps: float, dst_fps: float, blend: bool = False) -> None:
+        if src_fps <= 0 or dst_fps <= 0:
+            raise ValueError("Los fps deben ser mayores que 0")
+
+        self.src_fps: float = src_fps
+        self.dst_fps: float = dst_fps
+        self.blend: bool = blend
+        self._k: int = 0
+        self._t0: float | None = None
+        self._previous: float | None = None
+
+    @staticmethod
+    def expected(count: int, src_fps: float, dst_fps: float) -> int:
+        """Número de frames de salida para `count` frames de entrada."""
+        return max(math.ceil(count * dst_fps / src_fps - 1e-6), 1)
+
+    @staticmethod
+    def source_indices(
+        indices: np.ndarray, src_fps: float, dst_fps: float
+    ) -> np.ndarray:
+        """Frame de entrada más cercano a cada frame de salida."""
+        return np.floor(indices * src_fps / dst_fps + 0.5 + 1e-6).astype(np.int64)
+
+    def clock(self, msec: float) -> float:
+        """Convierte CAP_PROP_POS_MSEC en segundos desde el primer frame.
+
+        Si el contenedor no da marcas crecientes se avanza un periodo de entrada.
+        """
+        ts = msec / 1000
+        if self._t0 is None:
+            self._t0 = ts
+        ts -= self._t0
+
+        if self._previous is not None and ts <= self._previous:
+            ts = self._previous + 1 / self.src_fps
+        return ts
+
+    def push(self, ts: float) -> list[float]:
+        weights: list[float] = []
+        t = self._k / self.dst_fps
+
+        while t <= ts + 1e-6:
+            if self._previous is None:
+                a = 1.0
+            else:
+                a = (t - self._previous) / (ts - self._previous)
+                if not self.blend:
+                    a = float(a >= 0.5)
+            weights.append(min(max(a, 0.0), 1.0))
+            self._k += 1
+            t = self._k / self.dst_fps
+
+        self._previous = ts
+        return weights
+
+    def flush(self) -> int:
+        """Salidas pendientes que cubre el último frame hasta el final de su periodo."""
+        if self._previous is None:
+            return 0
+
+        end = self._previous + 1 / self.src_fps
+        pending = 0
+        while (self._k + pending) / self.dst_fps < end - 1e-6:
+            pending += 1
+        self._k += pending
+        return pending
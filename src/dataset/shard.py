@@ -0,0 +1,299 @@
+from argparse import ArgumentParser
+import json
+import time
+import polars as pl
+from .load import np, os, Allocator, RGBVideoLoader
+
+# Índice de cada shard: posición del video en el .bin y su número de frames
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("frames", "<u4")])
+METADATA_COLUMNS = ["path", "gloss", "category", "language"]
+
+
+def _shard_name(root: str, shard: int) -> str:
+    return os.path.join(root, f"shard-{shard:05d}")
+
+
+class ShardWriter:
+    """Empaqueta videos decodificados en ficheros grandes con índice y metadatos.
+
+    Cada shard se compone de `shard-NNNNN.bin` con los frames uint8 contiguos,
+    `shard-NNNNN.index.npy` con `(offset, frames)` por video y
+    `shard-NNNNN.csv` con las columnas `path, gloss, category, language`.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        fps: int = 16,
+        size: tuple[int, int] = (224, 224),
+        shard_bytes: int = 1 << 30,
+        blend: bool = False,
+    ) -> None:
+        if shard_bytes <= 0:
+            raise ValueError("El tamaño de shard debe ser mayor que 0")
+
+        os.makedirs(root, exist_ok=True)
+        meta_path = os.path.join(root, "meta.json")
+        meta = {"fps": fps, "size": list(size), "blend": blend}
+
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                existing = json.load(f)
+            # Los shards anteriores a guardar `blend` se escribieron sin mezclar
+            existing.setdefault("blend", False)
+            if existing != meta:
+                raise RuntimeError(f"{root} contiene shards con otro fps, tamaño o mezcla")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+
+        self.root: str = root
+        self.size: tuple[int, int] = size
+        self.shard_bytes: int = shard_bytes
+
+        # Se continúa tras el último shard existente
+        self._shard: int = len(
+            [f for f in os.listdir(root) if f.endswith(".index.npy")]
+        )
+        self._file = None
+        self._written: int = 0
+        self._index: list[tuple[int, int]] = []
+        self._rows: list[dict[str, str]] = []
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def add(
+        self,
+        video: np.ndarray,
+        path: str,
+        gloss: str = "",
+        category: str = "",
+        language: str = "",
+    ) -> None:
+        (w, h) = self.size
+        if video.dtype != np.uint8 or video.shape[1:] != (h, w, 3):
+            raise ValueError(f"Se esperaba un video uint8 (T, {h}, {w}, 3)")
+
+        if self._file is not None and self._written + video.nbytes > self.shard_bytes:
+            self._flush()
+
+        if self._file is None:
+            self._file = open(f"{_shard_name(self.root, self._shard)}.bin", "wb")
+            self._written = 0
+
+        self._index.append((self._written, len(video)))
+        self._rows.append(
+            {
+                "path": os.path.abspath(path),
+                "gloss": gloss,
+                "category": category,
+                "language": language,
+            }
+        )
+        self._file.write(np.ascontiguousarray(video).reshape(-1))
+        self._written += video.nbytes
+
+    def _flush(self) -> None:
+        self._file.close()
+        name = _shard_name(self.root, self._shard)
+        np.save(f"{name}.index.npy", np.array(self._index, dtype=INDEX_DTYPE))
+        pl.DataFrame(self._rows, schema=METADATA_COLUMNS).write_csv(f"{name}.csv")
+
+        self._shard += 1
+        self._file = None
+        self._index = []
+        self._rows = []
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._flush()
+
+
+class ShardReader:
+    """Acceso aleatorio a los shards: un seek y una lectura contigua por video."""
+
+    def __init__(self, root: str) -> None:
+        with open(os.path.join(root, "meta.json")) as f:
+            meta = json.load(f)
+
+        self.root: str = root
+        self.fps: int = meta["fps"]
+        self.size: tuple[int, int] = tuple(meta["size"])
+        self.blend: bool = meta.get("blend", False)
+
+        names = sorted(
+            f.removesuffix(".index.npy")
+            for f in os.listdir(root)
+            if f.endswith(".index.npy")
+        )
+        if not names:
+            raise RuntimeError(f"{root} no contiene shards")
+
+        indices = [np.load(os.path.join(root, f"{name}.index.npy")) for name in names]
+        self._shards: list[str] = [os.path.join(root, f"{name}.bin") for name in names]
+        self._shard: np.ndarray = np.concatenate(
+            [np.full(len(index), i, dtype=np.uint32) for i, index in enumerate(indices)]
+        )
+        self._index: np.ndarray = np.concatenate(indices)
+
+        self.metadata: pl.DataFrame = pl.concat(
+            [
+                pl.read_csv(
+                    os.path.join(root, f"{name}.csv"),
+                    schema={column: pl.String for column in METADATA_COLUMNS},
+                )
+                for name in names
+            ]
+        )
+        self.paths: list[str] = self.metadata["path"].to_list()
+        self._positions: dict[str, int] = {path: i for i, path in enumerate(self.paths)}
+        self._files: dict[int, object] = {}
+
+    def __getstate__(self) -> dict:
+        # Los ficheros abiertos no viajan a otros procesos, cada uno abre los suyos
+        state = self.__dict__.copy()
+        state["_files"] = {}
+        return state
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.abspath(path) in self._positions
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.read(i)
+
+    def read(self, i: int, alloc: Allocator | None = None) -> np.ndarray:
+        shard = int(self._shard[i])
+        offset, frames = self._index[i]
+        (w, h) = self.size
+
+        shape = (int(frames), h, w, 3)
+        video = alloc(shape) if alloc else np.empty(shape, dtype=np.uint8)
+
+        if shard not in self._files:
+            self._files[shard] = open(self._shards[shard], "rb", buffering=0)
+        f = self._files[shard]
+        f.seek(int(offset))
+        if f.readinto(video.reshape(-1)) != video.nbytes:
+            raise RuntimeError(f"El shard {self._shards[shard]} está truncado")
+        return video
+
+    def get(self, path: str, alloc: Allocator | None = None) -> np.ndarray:
+        return self.read(self._positions[os.path.abspath(path)], alloc)
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+def read_metadata(csvs: list[str], video_dir: str) -> pl.DataFrame:
+    """Une los metadata*.csv de StS con los mp4 descargados en `video_dir`."""
+    frames = [
+        pl.read_csv(csv).rename({"categorie": "category"}, strict=False)
+        for csv in csvs
+    ]
+    return (
+        pl.concat(
+            [frame.select("href", "video", "gloss", "category") for frame in frames]
+        )
+        .with_columns(
+            path=pl.col("video").map_elements(
+                lambda url: os.path.abspath(os.path.join(video_dir, url.split("/")[-1])),
+                return_dtype=pl.String,
+            ),
+            # El idioma es el primer segmento del href: /es.es/word/...
+            language=pl.col("href").str.split("/").list.get(1),
+        )
+        .filter(pl.col("path").map_elements(os.path.exists, return_dtype=pl.Boolean))
+        .unique(subset="path", keep="first", maintain_order=True)
+    )
+
+
+def pack(
+    csvs: list[str],
+    video_dir: str,
+    root: str,
+    loader: RGBVideoLoader,
+    shard_bytes: int = 1 << 30,
+) -> int:
+    """Añade a los shards de `root` los videos de los CSV y devuelve cuántos escribió.
+
+    Los que ya están en los shards se saltan, así que se puede reanudar.
+    """
+    metadata = read_metadata(csvs, video_dir)
+    added = 0
+
+    with ShardWriter(root, loader.fps, loader.size, shard_bytes, loader.blend) as writer:
+        packed = set(ShardReader(root).paths) if writer._shard > 0 else set()
+        for row in metadata.iter_rows(named=True):
+            if row["path"] in packed:
+                continue
+            writer.add(
+                loader._load_video(row["path"]),
+                row["path"],
+                gloss=row["gloss"] or "",
+                category=row["category"] or "",
+                language=row["language"] or "",
+            )
+            added += 1
+    return added
+
+
+def benchmark(
+    reader: ShardReader, samples: int = 100, seed: int = 0
+) -> dict[str, float]:
+    """Muestras/s con acceso aleatorio: mp4 sueltos frente a shards."""
+    candidates = [path for path in reader.paths if os.path.exists(path)]
+    if not candidates:
+        raise RuntimeError("Ningún video de los shards está disponible como mp4")
+
+    picks = np.random.default_rng(seed).choice(candidates, samples)
+    loose = RGBVideoLoader(fps=reader.fps, size=reader.size, blend=reader.blend)
+
+    start = time.perf_counter()
+    for path in picks:
+        loose._load_video(str(path))
+    mp4 = samples / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for path in picks:
+        reader.get(str(path))
+    shards = samples / (time.perf_counter() - start)
+
+    return {"mp4": mp4, "shards": shards}
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Empaquetado del corpus en shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pack_cmd = commands.add_parser("pack")
+    pack_cmd.add_argument("--metadata", nargs="+", required=True)
+    pack_cmd.add_argument("--videos", required=True)
+    pack_cmd.add_argument("--out", required=True)
+    pack_cmd.add_argument("--fps", type=int, default=16)
+    pack_cmd.add_argument("--size", type=int, nargs=2, default=(224, 224))
+    pack_cmd.add_argument("--shard-bytes", type=int, default=1 << 30)
+    pack_cmd.add_argument("--blend", action="store_true")
+
+    bench_cmd = commands.add_parser("bench")
+    bench_cmd.add_argument("--shards", required=True)
+    bench_cmd.add_argument("--samples", type=int, default=100)
+
+    args = parser.parse_args()
+    match args.command:
+        case "pack":
+            loader = RGBVideoLoader(fps=args.fps, size=tuple(args.size), blend=args.blend)
+            added = pack(args.metadata, args.videos, args.out, loader, args.shard_bytes)
+            print(f"{added} videos nuevos, {len(ShardReader(args.out))} en total en {args.out}")
+        case "bench":
+            result = benchmark(ShardReader(args.shards), args.samples)
+            print(f"mp4: {result['mp4']:.1f} muestras/s")
+            print(f"shards: {result['shards']:.1f} muestras/s")
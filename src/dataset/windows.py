@@ -0,0 +1,24 @@
+import numpy as np
+
+
+def padded_indices(frames: int, num_in_frames: int) -> np.ndarray:
+    """Índices de un video de `frames` frames repitiendo el último hasta `num_in_frames`.
+
+    Los videos de al menos `num_in_frames` frames se quedan como están.
+    """
+    if frames <= 0:
+        raise ValueError("El video no tiene frames")
+    return np.minimum(np.arange(max(frames, num_in_frames)), frames - 1)
+
+
+def window_starts(frames: int, num_in_frames: int, stride: int) -> np.ndarray:
+    """Frame inicial de cada ventana; la última se ajusta al final del video.
+
+    `frames` es la longitud antes de `padded_indices`: un video más corto que
+    una ventana tiene una sola, que empieza en 0.
+    """
+    frames = len(padded_indices(frames, num_in_frames))
+    starts = np.arange(0, frames - num_in_frames + 1, stride)
+    if starts[-1] != frames - num_in_frames:
+        starts = np.append(starts, frames - num_in_frames)
+    return starts
@@ -8,271 +8,38 @@ app = marimo.App(width="medium")
 def _():
     import math
     import torch
-    import torch.nn as nn
     import torch.nn.functional as F
     import numpy as np
     import cv2
 
     import os
+    from inference.model import InceptionI3d
     os.environ["PYTORCH_ENABLE_MPS_FALLBACK"] = "1"
-
-    __all__ = ["InceptionI3d"]
-
-
-    class MaxPool3dSamePadding(nn.MaxPool3d):
-        def compute_pad(self, dim, s):
-            if s % self.stride[dim] == 0:
-                return max(self.kernel_size[dim] - self.stride[dim], 0)
-            else:
-                return max(self.kernel_size[dim] - (s % self.stride[dim]), 0)
-
-        def forward(self, x):
-            (batch, channel, t, h, w) = x.size()
-            pad_t = self.compute_pad(0, t)
-            pad_h = self.compute_pad(1, h)
-            pad_w = self.compute_pad(2, w)
-
-            pad_t_f = pad_t // 2
-            pad_t_b = pad_t - pad_t_f
-            pad_h_f = pad_h // 2
-            pad_h_b = pad_h - pad_h_f
-            pad_w_f = pad_w // 2
-            pad_w_b = pad_w - pad_w_f
-
-            pad = (pad_w_f, pad_w_b, pad_h_f, pad_h_b, pad_t_f, pad_t_b)
-            x = F.pad(x, pad)
-            return super(MaxPool3dSamePadding, self).forward(x)
-
-
-    class Unit3D(nn.Module):
-        def __init__(self, in_channels, output_channels, kernel_shape=(1, 1, 1),
-                     stride=(1, 1, 1), activation_fn=F.relu, use_batch_norm=True,
-                     use_bias=False):
-            super(Unit3D, self).__init__()
-
-            self._output_channels = output_channels
-            self._kernel_shape = kernel_shape
-            self._stride = stride
-            self._use_batch_norm = use_batch_norm
-            self._activation_fn = activation_fn
-            self._use_bias = use_bias
-
-            self.conv3d = nn.Conv3d(
-                in_channels=in_channels,
-                out_channels=self._output_channels,
-                kernel_size=self._kernel_shape,
-                stride=self._stride,
-                padding=0,
-                bias=self._use_bias,
-            )
-
-            if self._use_batch_norm:
-                self.bn = nn.BatchNorm3d(self._output_channels, eps=0.001, momentum=0.01)
-
-        def compute_pad(self, dim, s):
-            if s % self._stride[dim] == 0:
-                return max(self._kernel_shape[dim] - self._stride[dim], 0)
-            else:
-                return max(self._kernel_shape[dim] - (s % self._stride[dim]), 0)
-
-        def forward(self, x):
-            (batch, channel, t, h, w) = x.size()
-            pad_t = self.compute_pad(0, t)
-            pad_h = self.compute_pad(1, h)
-            pad_w = self.compute_pad(2, w)
-
-            pad_t_f = pad_t // 2
-            pad_t_b = pad_t - pad_t_f
-            pad_h_f = pad_h // 2
-            pad_h_b = pad_h - pad_h_f
-            pad_w_f = pad_w // 2
-            pad_w_b = pad_w - pad_w_f
-
-            pad = (pad_w_f, pad_w_b, pad_h_f, pad_h_b, pad_t_f, pad_t_b)
-            x = F.pad(x, pad)
-            x = self.conv3d(x)
-
-            if self._use_batch_norm:
-                x = self.bn(x)
-            if self._activation_fn is not None:
-                x = self._activation_fn(x)
-            return x
-
-
-    class InceptionModule(nn.Module):
-        def __init__(self, in_channels, out_channels):
-            super(InceptionModule, self).__init__()
-
-            # Branch 0: 1x1x1 conv
-            self.b0 = Unit3D(in_channels, out_channels[0], kernel_shape=[1, 1, 1])
-
-            # Branch 1: 1x1x1 conv -> 3x3x3 conv
-            self.b1a = Unit3D(in_channels, out_channels[1], kernel_shape=[1, 1, 1])
-            self.b1b = Unit3D(out_channels[1], out_channels[2], kernel_shape=[3, 3, 3])
-
-            # Branch 2: 1x1x1 conv -> 3x3x3 conv
-            self.b2a = Unit3D(in_channels, out_channels[3], kernel_shape=[1, 1, 1])
-            self.b2b = Unit3D(out_channels[3], out_channels[4], kernel_shape=[3, 3, 3])
-
-            # Branch 3: MaxPool -> 1x1x1 conv
-            self.b3a = MaxPool3dSamePadding(kernel_size=[3, 3, 3], stride=(1, 1, 1), padding=0)
-            self.b3b = Unit3D(in_channels, out_channels[5], kernel_shape=[1, 1, 1])
-
-        def forward(self, x):
-            b0 = self.b0(x)
-            b1 = self.b1b(self.b1a(x))
-            b2 = self.b2b(self.b2a(x))
-            b3 = self.b3b(self.b3a(x))
-            return torch.cat([b0, b1, b2, b3], dim=1)
-
-
-    class InceptionI3d(nn.Module):
-        """I3D: Inflated 3D ConvNet para clasificación de videos."""
-
-        def __init__(self, num_classes=400, spatiotemporal_squeeze=True,
-                     in_channels=3, dropout_keep_prob=0.5, num_in_frames=64,
-                     include_embds=False):
-            super().__init__()
-
-            self._num_classes = num_classes
-            self._spatiotemporal_squeeze = spatiotemporal_squeeze
-            self.include_embds = include_embds
-
-            # Configuración de la arquitectura (más compacto)
-            # Stem
-            self.stem = nn.Sequential(
-                Unit3D(in_channels, 64, kernel_shape=[7, 7, 7], stride=(2, 2, 2)),
-                MaxPool3dSamePadding(kernel_size=[1, 3, 3], stride=(1, 2, 2), padding=0),
-                Unit3D(64, 64, kernel_shape=[1, 1, 1]),
-                Unit3D(64, 192, kernel_shape=[3, 3, 3]),
-                MaxPool3dSamePadding(kernel_size=[1, 3, 3], stride=(1, 2, 2), padding=0),
-            )
-
-            # Inception modules (organizados por bloques)
-            self.inception_3 = nn.Sequential(
-                InceptionModule(192, [64, 96, 128, 16, 32, 32]),   # 3b: 256
-                InceptionModule(256, [128, 128, 192, 32, 96, 64]),  # 3c: 480
-            )
-
-            self.pool_4a = MaxPool3dSamePadding(kernel_size=[3, 3, 3], stride=(2, 2, 2), padding=0)
-
-            self.inception_4 = nn.Sequential(
-                InceptionModule(480, [192, 96, 208, 16, 48, 64]),   # 4b: 512
-                InceptionModule(512, [160, 112, 224, 24, 64, 64]),  # 4c: 512
-                InceptionModule(512, [128, 128, 256, 24, 64, 64]),  # 4d: 512
-                InceptionModule(512, [112, 144, 288, 32, 64, 64]),  # 4e: 528
-                InceptionModule(528, [256, 160, 320, 32, 128, 128]), # 4f: 832
-            )
-
-            self.pool_5a = MaxPool3dSamePadding(kernel_size=[2, 2, 2], stride=(2, 2, 2), padding=0)
-
-            self.inception_5 = nn.Sequential(
-                InceptionModule(832, [256, 160, 320, 32, 128, 128]), # 5b: 832
-                InceptionModule(832, [384, 192, 384, 48, 128, 128]), # 5c: 1024
-            )
-
-            # Head
-            last_duration = int(math.ceil(num_in_frames / 8))
-            last_size = 7
-            self.avgpool = nn.AvgPool3d((last_duration, last_size, last_size), stride=1)
-            self.dropout = nn.Dropout(dropout_keep_prob)
-            self.logits = Unit3D(1024, self._num_classes, kernel_shape=[1, 1, 1],
-                                activation_fn=None, use_batch_norm=False, use_bias=True)
-
-        def forward(self, x):
-            x = self.stem(x)
-            x = self.inception_3(x)
-            x = self.pool_4a(x)
-            x = self.inception_4(x)
-            x = self.pool_5a(x)
-            x = self.inception_5(x)
-
-            embds = self.dropout(self.avgpool(x))
-            x = self.logits(embds)
-
-            if self._spatiotemporal_squeeze:
-                logits = x.squeeze(3).squeeze(3).squeeze(2)
-
-            if self.include_embds:
-                return {"logits": logits, "embds": embds}
-            else:
-                return {"logits": logits}
-
-        def load_old_state_dict(self, old_state_dict):
-            """Carga un state_dict del modelo original (verboso) al simplificado."""
-            # Mapeo: nombre_antiguo -> nombre_nuevo
-            name_mapping = {
-                # Stem
-                'Conv3d_1a_7x7': 'stem.0',
-                'MaxPool3d_2a_3x3': 'stem.1',
-                'Conv3d_2b_1x1': 'stem.2',
-                'Conv3d_2c_3x3': 'stem.3',
-                'MaxPool3d_3a_3x3': 'stem.4',
-
-                # Inception 3
-                'Mixed_3b': 'inception_3.0',
-                'Mixed_3c': 'inception_3.1',
-
-                # Pool 4a
-                'MaxPool3d_4a_3x3': 'pool_4a',
-
-                # Inception 4
-                'Mixed_4b': 'inception_4.0',
-                'Mixed_4c': 'inception_4.1',
-                'Mixed_4d': 'inception_4.2',
-                'Mixed_4e': 'inception_4.3',
-                'Mixed_4f': 'inception_4.4',
-
-                # Pool 5a
-                'MaxPool3d_5a_2x2': 'pool_5a',
-
-                # Inception 5
-                'Mixed_5b': 'inception_5.0',
-                'Mixed_5c': 'inception_5.1',
-
-                # Head (avgpool y dropout no tienen params)
-                'logits': 'logits',
-            }
-
-            # Crear nuevo state_dict con nombres mapeados
-            new_state_dict = {}
-            for old_name, param in old_state_dict.items():
-                # Buscar el prefijo que coincida
-                new_name = old_name
-                for old_prefix, new_prefix in name_mapping.items():
-                    if old_name.startswith(old_prefix + '.'):
-                        # Reemplazar el prefijo
-                        new_name = old_name.replace(old_prefix + '.', new_prefix + '.')
-                        break
-                    elif old_name == old_prefix:
-                        new_name = new_prefix
-                        break
-
-                new_state_dict[new_name] = param
-
-            # Cargar el state_dict mapeado
-            self.load_state_dict(new_state_dict, strict=True)
-            return self
-    return F, InceptionI3d, cv2, math, np, torch
+    return F, InceptionI3d, cv2, math, np, os, torch
 
 
 @app.cell
 def _():
     checkpoint: str = 'i3d.pth.tar'
-    return (checkpoint,)
+    # Pesos ya renombrados, que se cargan con mmap (python -m inference.checkpoint)
+    weights: str = 'i3d.weights.pt'
+    # Frames por ventana: fija el avgpool del modelo y la longitud de todos los clips
+    num_in_frames: int = 16
+    return checkpoint, num_in_frames, weights
 
 
 @app.cell
-def _(InceptionI3d, checkpoint: str, torch):
-    model = InceptionI3d(num_classes=1064)
+def _(InceptionI3d, checkpoint: str, num_in_frames: int, os, torch, weights: str):
+    from inference.checkpoint import convert_checkpoint, load_model
 
-    state_dict = torch.load(checkpoint)
-    state_dict = {k.replace('module.', ''): v for k, v in state_dict.items()}
+    if not os.path.exists(weights):
+        convert_checkpoint(checkpoint, weights)
 
-    model = model.load_old_state_dict(state_dict)
+    model = load_model(
+        lambda: InceptionI3d(num_classes=1064, num_in_frames=num_in_frames), weights
+    )
     device = torch.device('cpu')
     model = model.to(device)
-    torch.compile(model=model, backend='mps')
     model.eval()
     print(model)
     return (model,)
@@ -332,8 +99,9 @@ def _(np, torch):
 
 
 @app.cell
-def _(color_normalize, cv2, im_to_numpy, math, np, to_torch, torch):
-
+def _(F, color_normalize, cv2, im_to_numpy, np, to_torch, torch):
+    from dataset.profile import span
+    from dataset.windows import padded_indices, window_starts
 
 
     def prepare_input(
@@ -351,109 +119,190 @@ def _(color_normalize, cv2, im_to_numpy, math, np, to_torch, torch):
         """
         iC, iF, iH, iW = rgb.shape
         # Resize
-        rgb_resized = np.zeros((iF, resize_res, resize_res, iC))
-        for t in range(iF):
-            tmp = rgb[:, t, :, :]
-            rgb_resized[t] = cv2.resize(im_to_numpy(tmp), (resize_res, resize_res))
-
-        rgb = np.transpose(rgb_resized, (3, 0, 1, 2))
-        # Center crop coords
-        ulx = int((resize_res - inp_res) / 2)
-        uly = int((resize_res - inp_res) / 2)
-        # Crop 256x256
-        rgb = rgb[:, :, uly : uly + inp_res, ulx : ulx + inp_res]
-        rgb = to_torch(rgb).float()
+        with span("resize", frames=iF) as stage:
+            rgb_resized = np.zeros((iF, resize_res, resize_res, iC))
+            for t in range(iF):
+                tmp = rgb[:, t, :, :]
+                rgb_resized[t] = cv2.resize(im_to_numpy(tmp), (resize_res, resize_res))
+            stage.add(rgb_resized.nbytes)
+
+        with span("crop", frames=iF) as stage:
+            rgb = np.transpose(rgb_resized, (3, 0, 1, 2))
+            # Center crop coords
+            ulx = int((resize_res - inp_res) / 2)
+            uly = int((resize_res - inp_res) / 2)
+            # Crop 256x256
+            rgb = rgb[:, :, uly : uly + inp_res, ulx : ulx + inp_res]
+            rgb = to_torch(rgb).float()
+            stage.add(rgb.nbytes)
         assert rgb.max() <= 1
-        rgb = color_normalize(rgb, mean, std)
+        with span("normalize", nbytes=rgb.nbytes, frames=iF):
+            rgb = color_normalize(rgb, mean, std)
+        return rgb
+
+    def prepare_input_uint8(rgb: torch.Tensor, resize_res: int = 256, inp_res: int = 224):
+        """
+        Resize y recorte central de un video uint8 (3, T, H, W) en una sola
+        llamada para todos los frames, sin pasar a float. La normalización de
+        `prepare_input` la hace el modelo de `for_uint8_input`. El bilineal de
+        torch difiere del de cv2 en como mucho un nivel de gris.
+        """
+        iC, iF, iH, iW = rgb.shape
+        with span("resize", frames=iF) as stage:
+            # Los frames hacen de batch: (T, 3, H, W)
+            rgb_resized = F.interpolate(
+                rgb.transpose(0, 1), size=(resize_res, resize_res),
+                mode="bilinear", align_corners=False, antialias=False,
+            )
+            stage.add(rgb_resized.nbytes)
+
+        with span("crop", frames=iF) as stage:
+            offset = (resize_res - inp_res) // 2
+            rgb = rgb_resized[:, :, offset:offset + inp_res, offset:offset + inp_res]
+            rgb = rgb.transpose(0, 1).contiguous()
+            stage.add(rgb.nbytes)
         return rgb
 
+    def pad_to_length(rgb: torch.Tensor, num_in_frames: int) -> torch.Tensor:
+        """Repite el último frame hasta la longitud mínima de un clip."""
+        nFrames = rgb.shape[1]
+        if nFrames >= num_in_frames:
+            return rgb
+        return rgb[:, torch.from_numpy(padded_indices(nFrames, num_in_frames))]
+
     def sliding_windows(rgb: torch.Tensor, num_in_frames: int, stride: int,) -> tuple:
         """
         Return sliding windows and corresponding (middle) timestamp
+
+        Las ventanas son una vista `(num_clips, C, num_in_frames, H, W)` sobre
+        `rgb`, sin copiar frames. Si la última ventana no cae en la rejilla de
+        `stride` (empieza en `nFrames - num_in_frames`), el resultado se copia
+        en un tensor nuevo; para videos largos conviene `windowed_inference`.
         """
-        C, nFrames, H, W = rgb.shape
-        # If needed, pad to the minimum clip length
-        if nFrames < num_in_frames:
-            rgb_ = torch.zeros(C, num_in_frames, H, W)
-            rgb_[:, :nFrames] = rgb
-            rgb_[:, nFrames:] = rgb[:, -1].unsqueeze(1)
-            rgb = rgb_
-            nFrames = rgb.shape[1]
-
-        num_clips = math.ceil((nFrames - num_in_frames) / stride) + 1
+        rgb = pad_to_length(rgb, num_in_frames)
+        starts = window_starts(rgb.shape[1], num_in_frames, stride)
+
+        num_clips = len(starts)
         plural = ""
         if num_clips > 1:
             plural = "s"
         print(f"{num_clips} clip{plural} resulted from sliding window processing.")
 
-        rgb_slided = torch.zeros(num_clips, 3, num_in_frames, H, W)
-        t_mid = []
-        # For each clip
-        for j in range(num_clips):
-            # Check if num_clips becomes 0
-            actual_clip_length = min(num_in_frames, nFrames - j * stride)
-            if actual_clip_length == num_in_frames:
-                t_beg = j * stride
-            else:
-                t_beg = nFrames - num_in_frames
-            t_mid.append(t_beg + num_in_frames / 2)
-            rgb_slided[j] = rgb[:, t_beg : t_beg + num_in_frames, :, :]
-        return rgb_slided, np.array(t_mid)
-    return prepare_input, sliding_windows
+        # (C, clips, H, W, T) → (clips, C, T, H, W)
+        regular = 1 + (rgb.shape[1] - num_in_frames) // stride
+        rgb_slided = rgb.unfold(1, num_in_frames, stride)[:, :regular]
+        rgb_slided = rgb_slided.permute(1, 0, 4, 2, 3)
+        if regular < num_clips:
+            tail = rgb[:, starts[-1] :].unsqueeze(0)
+            rgb_slided = torch.cat([rgb_slided, tail])
+        return rgb_slided, starts + num_in_frames / 2
+
+    def windowed_inference(
+        model: torch.nn.Module,
+        rgb: torch.Tensor,
+        num_in_frames: int = 16,
+        stride: int = 1,
+        max_bytes: int = 256 * 1024**2,
+    ) -> dict[str, torch.Tensor]:
+        """Evalúa el modelo sobre las ventanas de `rgb` en lotes acotados en memoria.
+
+        Cada lote copia sus ventanas en un buffer reutilizado de como mucho
+        `max_bytes` (al menos una ventana), así que la memoria de la entrada
+        no crece con la duración del video; las activaciones del modelo
+        escalan con el tamaño del lote. Devuelve las salidas del modelo
+        concatenadas por ventana y `t_mid`, el frame central de cada una.
+        """
+        rgb = pad_to_length(rgb, num_in_frames)
+        C, nFrames, H, W = rgb.shape
+        starts = window_starts(nFrames, num_in_frames, stride)
+
+        clip_bytes = C * num_in_frames * H * W * rgb.element_size()
+        chunk = max(1, min(len(starts), max_bytes // clip_bytes))
+        buffer = torch.empty(chunk, C, num_in_frames, H, W, dtype=rgb.dtype, device=rgb.device)
+
+        outputs: dict[str, list[torch.Tensor]] = {}
+        with torch.no_grad():
+            for i in range(0, len(starts), chunk):
+                batch = starts[i : i + chunk]
+                clips = buffer[: len(batch)]
+                torch.stack([rgb[:, t : t + num_in_frames] for t in batch], out=clips)
+                for key, value in model(clips).items():
+                    outputs.setdefault(key, []).append(value)
+
+        results = {key: torch.cat(values) for key, values in outputs.items()}
+        results["t_mid"] = torch.from_numpy(starts + num_in_frames / 2)
+        return results
+    return (
+        prepare_input,
+        prepare_input_uint8,
+        sliding_windows,
+        span,
+        windowed_inference,
+    )
 
 
 @app.cell
-def _(cv2, im_to_torch, torch):
-    import shutil
-    import subprocess
+def _(cv2, im_to_torch, span, torch):
     from pathlib import Path
+    from dataset.resample import FpsResampler
 
 
 
-    def load_rgb_video(video_path: Path, fps: int) -> torch.Tensor:
+    def load_rgb_video(
+        video_path: Path, fps: int, blend: bool = False, uint8: bool = False
+    ) -> torch.Tensor:
         """
         Load a video as a torch tensor (3, T, H, W). If the video FPS does not match
-        the target FPS, create a temporary ffmpeg copy with the desired frame rate.
+        the target FPS, frames are dropped/duplicated (or linearly blended) by
+        timestamp while decoding; the source file is never modified.
+
+        Con `uint8`, los frames se quedan en uint8 (sin `/255`), para
+        `prepare_input_uint8` y un modelo de `for_uint8_input`.
         """
         video_path = Path(video_path)
-        cap = cv2.VideoCapture(str(video_path))
+        with span("open", str(video_path)):
+            cap = cv2.VideoCapture(str(video_path))
         cap_fps = cap.get(cv2.CAP_PROP_FPS)
         cap_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         cap_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-
-        if abs(cap_fps - fps) > 1e-2:
-            tmp_video = video_path.with_suffix(f".tmp{video_path.suffix}")
-            shutil.copy(video_path, tmp_video)
-            cmd = [
-                "ffmpeg", "-y", "-i", str(tmp_video),
-                "-pix_fmt", "yuv420p",
-                "-filter:v", f"fps=fps={fps}",
-                str(video_path)
-            ]
-            print(f"Generating new copy of video with frame rate {fps}")
-            subprocess.run(cmd, check=True)
-            tmp_video.unlink(missing_ok=True)
-            cap.release()
-            cap = cv2.VideoCapture(str(video_path))
-            cap_fps = cap.get(cv2.CAP_PROP_FPS)
-            assert abs(cap_fps - fps) < 1e-2, f"ffmpeg failed to produce {fps} FPS video"
+        resampler = FpsResampler(cap_fps if cap_fps > 0 else fps, fps, blend)
 
         frames = []
+        previous = current = None
         while True:
-            ret, frame = cap.read()
+            with span("read", str(video_path)) as stage:
+                ret, frame = cap.read()
+                if ret:
+                    stage.add(frame.nbytes, 1)
             if not ret:
                 break
-            frame = frame[:, :, [2, 1, 0]]  # BGR → RGB
-            frames.append(im_to_torch(frame))
+            with span("convert", str(video_path), frame.nbytes, 1):
+                frame = frame[:, :, [2, 1, 0]]  # BGR → RGB
+                if uint8:
+                    previous, current = current, torch.from_numpy(frame).permute(2, 0, 1)
+                else:
+                    previous, current = current, im_to_torch(frame)
+            for a in resampler.push(resampler.clock(cap.get(cv2.CAP_PROP_POS_MSEC))):
+                if previous is None or a >= 1:
+                    frames.append(current)
+                elif a <= 0:
+                    frames.append(previous)
+                elif uint8:
+                    frames.append(torch.lerp(previous.float(), current.float(), a).round_().byte())
+                else:
+                    frames.append(torch.lerp(previous, current, a))
+        frames.extend([current] * resampler.flush())
         cap.release()
 
         if not frames:
             raise ValueError(f"No frames read from {video_path}")
 
-        rgb = torch.stack(frames).permute(1, 0, 2, 3)
-        print(f"Loaded {len(frames)} frames from {video_path} ({cap_height}x{cap_width} @ {cap_fps:.2f} fps)")
+        with span("stack", str(video_path), frames=len(frames)) as stage:
+            rgb = torch.stack(frames).permute(1, 0, 2, 3)
+            stage.add(rgb.nbytes)
+        print(f"Loaded {len(frames)} frames from {video_path} ({cap_height}x{cap_width} @ {cap_fps:.2f} fps → {fps} fps)")
         return rgb
-    return (load_rgb_video,)
+    return Path, load_rgb_video
 
 
 @app.cell
@@ -471,29 +320,98 @@ def _(F, video):
 
 
 @app.cell
-def _(load_rgb_video, prepare_input, sliding_windows, torch):
+def _(load_rgb_video, num_in_frames: int, prepare_input, sliding_windows):
 
 
     # video: (3, T, H, W)
     video = load_rgb_video("maldicion16.mp4", 16)
     video = prepare_input(video)
 
-    slices = sliding_windows(video, 16,1)
-    print(slices[0].shape)
-    frames16fps = slices[0].to(torch.device('cpu'))
+    # Vista sin copia: (clips, 3, num_in_frames, H, W)
+    windows, t_mid = sliding_windows(video, num_in_frames, 1)
+    print(windows.shape)
 
-    return frames16fps, video
+    return (video,)
 
 
 @app.cell
-def _(frames16fps, model, torch):
+def _(model, num_in_frames: int, video, windowed_inference):
 
     if False:
-        with torch.no_grad():
-            outs = model(frames16fps)
+        outs = windowed_inference(model, video, num_in_frames, 1)
     return (outs,)
 
 
+@app.cell
+def _(model, video):
+    from inference.stream import StreamingI3D
+
+    if False:
+        # Una predicción cada 8 frames, pasando el video en trozos como llegarían de la cámara
+        streamed = StreamingI3D(model).run(video.unsqueeze(0), chunk=8)
+    return
+
+
+@app.cell
+def _(
+    Path,
+    load_rgb_video,
+    model,
+    num_in_frames: int,
+    prepare_input,
+    sliding_windows,
+):
+    from dataset.load import RGBVideoLoader
+    from inference.quantize import agreement_report, export_int8, format_report, quantize_int8
+
+    # Clips locales de calibración: hasta `clips_per_video` ventanas con paso 8 por video
+    calibration_dir = Path("../videos-signos")
+    clips_per_video = 4
+
+    if False:
+        clips = []
+        for _path in sorted(p for p in calibration_dir.iterdir() if RGBVideoLoader.is_video(p.name)):
+            _video = prepare_input(load_rgb_video(_path, 16))
+            _windows, _ = sliding_windows(_video, num_in_frames, 8)
+            clips.append(_windows[:clips_per_video].contiguous())
+
+        int8_model = quantize_int8(model, clips)
+        print(format_report(agreement_report(model, int8_model, clips)))
+        export_int8(int8_model, "i3d.int8.pt", clips[0][:1])
+    return
+
+
+@app.cell
+def _(InceptionI3d, model, num_in_frames: int, weights: str):
+    from inference.export import benchmark, export_model, format_benchmark
+
+    # Artefacto de CPU para la forma fija de `example_input`: (1, 3, num_in_frames, 224, 224)
+    artifact = 'i3d.cpu.pt2'
+
+    if False:
+        _example = model.example_input()
+        _inference = model.fuse_for_inference().plan_padding(tuple(_example.shape))
+        export_model(_inference, artifact, _example)
+        _build = lambda: InceptionI3d(num_classes=1064, num_in_frames=num_in_frames)
+        print(format_benchmark(benchmark(artifact, _build, weights)))
+    return
+
+
+@app.cell
+def _(
+    load_rgb_video,
+    model,
+    num_in_frames: int,
+    prepare_input_uint8,
+    windowed_inference,
+):
+    if False:
+        # Entrada uint8 de principio a fin: la normalización va en la conv del stem
+        _video = prepare_input_uint8(load_rgb_video("maldicion16.mp4", 16, uint8=True))
+        outs_uint8 = windowed_inference(model.for_uint8_input(), _video, num_in_frames, 1)
+    return
+
+
 @app.cell
 def _(outs):
     outs
@@ -0,0 +1,102 @@
+from argparse import ArgumentParser
+from typing import Callable
+import os
+import time
+import torch
+import torch.nn as nn
+
+# Mapeo: nombre_antiguo -> nombre_nuevo del primer componente de cada clave
+NAME_MAPPING: dict[str, str] = {
+    # Stem
+    "Conv3d_1a_7x7": "stem.0",
+    "MaxPool3d_2a_3x3": "stem.1",
+    "Conv3d_2b_1x1": "stem.2",
+    "Conv3d_2c_3x3": "stem.3",
+    "MaxPool3d_3a_3x3": "stem.4",
+    # Inception 3
+    "Mixed_3b": "inception_3.0",
+    "Mixed_3c": "inception_3.1",
+    # Pool 4a
+    "MaxPool3d_4a_3x3": "pool_4a",
+    # Inception 4
+    "Mixed_4b": "inception_4.0",
+    "Mixed_4c": "inception_4.1",
+    "Mixed_4d": "inception_4.2",
+    "Mixed_4e": "inception_4.3",
+    "Mixed_4f": "inception_4.4",
+    # Pool 5a
+    "MaxPool3d_5a_2x2": "pool_5a",
+    # Inception 5
+    "Mixed_5b": "inception_5.0",
+    "Mixed_5c": "inception_5.1",
+    # Head (avgpool y dropout no tienen params)
+    "logits": "logits",
+}
+
+
+def remap_name(name: str) -> str:
+    """Nombre en InceptionI3d de una clave del modelo original (verboso)."""
+    name = name.removeprefix("module.")
+    prefix, dot, rest = name.partition(".")
+    return NAME_MAPPING.get(prefix, prefix) + dot + rest
+
+
+def remap_state_dict(state_dict: dict[str, torch.Tensor]) -> dict[str, torch.Tensor]:
+    return {remap_name(name): tensor for name, tensor in state_dict.items()}
+
+
+def convert_checkpoint(src: str, dst: str) -> int:
+    """Escribe una sola vez los pesos renombrados en un archivo que se puede mapear.
+
+    Admite el checkpoint plano o uno con la clave `state_dict`. Devuelve el
+    número de tensores escritos.
+    """
+    checkpoint = torch.load(src, map_location="cpu", weights_only=True)
+    state_dict = checkpoint.get("state_dict", checkpoint)
+    weights = {
+        name: tensor.contiguous() for name, tensor in remap_state_dict(state_dict).items()
+    }
+
+    tmp = f"{dst}.tmp"
+    torch.save(weights, tmp)
+    os.replace(tmp, dst)
+    return len(weights)
+
+
+def load_weights(path: str) -> dict[str, torch.Tensor]:
+    """Pesos convertidos como tensores sobre un mmap del archivo: no se leen hasta usarlos.
+
+    Las páginas son de la caché del sistema, así que varios procesos que
+    cargan el mismo archivo comparten la memoria de los pesos.
+    """
+    return torch.load(path, mmap=True, weights_only=True, map_location="cpu")
+
+
+def load_model(build: Callable[[], nn.Module], path: str) -> nn.Module:
+    """Construye el modelo en el dispositivo meta y le asigna los pesos mapeados.
+
+    Con `assign=True` los parámetros pasan a ser los propios tensores del mmap,
+    sin reservar ni inicializar antes pesos aleatorios que luego se copian.
+    """
+    with torch.device("meta"):
+        model = build()
+    model.load_state_dict(load_weights(path), strict=True, assign=True)
+    return model.eval()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Convierte un checkpoint de I3D a pesos mapeables")
+    parser.add_argument("--src", required=True)
+    parser.add_argument("--dst", required=True)
+
+    args = parser.parse_args()
+    start = time.perf_counter()
+    count = convert_checkpoint(args.src, args.dst)
+    print(
+        f"{count} tensores en {args.dst} "
+        f"({os.path.getsize(args.dst) / 1024**2:.1f} MB, {time.perf_counter() - start:.2f} s)"
+    )
+
+    start = time.perf_counter()
+    load_weights(args.dst)
+    print(f"Carga con mmap: {1e3 * (time.perf_counter() - start):.1f} ms")
@@ -0,0 +1,320 @@
+from argparse import ArgumentParser
+from typing import Callable
+import csv
+import hashlib
+import json
+import os
+import numpy as np
+import torch
+from dataset.load import RGBVideoLoader
+from dataset.windows import padded_indices, window_starts
+from .checkpoint import load_model
+from .export import export_model, load_artifact
+from .model import InceptionI3d
+
+
+def export_embedding_artifact(
+    weights: str, path: str, batch: int, num_in_frames: int = 16, num_classes: int = 1064
+) -> None:
+    """Exporta I3D con `include_embds` para lotes de `batch` ventanas a la vez.
+
+    Es el artefacto del notebook (fusionado y con el padding fijado), pero
+    con embeddings: el tamaño del lote de `FeatureStore.extract` es el de la
+    entrada con la que se exporta.
+    """
+    model = load_model(
+        lambda: InceptionI3d(
+            num_classes=num_classes, num_in_frames=num_in_frames, include_embds=True
+        ),
+        weights,
+    )
+    example = model.example_input(batch)
+    export_model(model.fuse_for_inference().plan_padding(tuple(example.shape)), path, example)
+
+
+def videos_from_metadata(csv_paths: list[str], videos_dir: str) -> dict[str, str]:
+    """Id y ruta local de cada video de los CSV de metadatos que ya esté descargado.
+
+    El id es el nombre del archivo de la URL sin extensión (`.../271487.mp4`
+    → `271487`), y se busca con ese nombre en `videos_dir`.
+    """
+    videos: dict[str, str] = {}
+    for csv_path in csv_paths:
+        with open(csv_path, newline="") as f:
+            for row in csv.DictReader(f):
+                name = row["video"].rsplit("/", 1)[-1]
+                path = os.path.join(videos_dir, name)
+                if os.path.exists(path):
+                    videos[os.path.splitext(name)[0]] = path
+    return videos
+
+
+def videos_from_dir(videos_dir: str) -> dict[str, str]:
+    return {
+        os.path.splitext(f)[0]: os.path.join(videos_dir, f)
+        for f in sorted(os.listdir(videos_dir))
+        if RGBVideoLoader.is_video(f)
+    }
+
+
+class _Pending:
+    """Salidas de un video mientras sus ventanas pasan por los batches."""
+
+    def __init__(self, entry: dict, windows: int) -> None:
+        self.entry: dict = entry
+        self.remaining: int = windows
+        # Se reservan con la primera salida, cuando se conocen sus dimensiones
+        self.embds: np.ndarray | None = None
+        self.logits: np.ndarray | None = None
+
+    def store(self, window: int, embds: np.ndarray, logits: np.ndarray) -> bool:
+        """Guarda las salidas de una ventana y devuelve si el video está completo."""
+        if self.embds is None:
+            windows = self.entry["windows"]
+            self.embds = np.empty((windows, len(embds)), dtype=np.float32)
+            self.logits = np.empty((windows, len(logits)), dtype=np.float32)
+        self.embds[window] = embds
+        self.logits[window] = logits
+        self.remaining -= 1
+        return self.remaining == 0
+
+
+class FeatureStore:
+    """Embeddings y logits por ventana, en chunks `.npy` bajo `root/<versión>/`.
+
+    La versión depende del artefacto del modelo (que fija también el recorte y
+    el tamaño del lote), el paso entre ventanas, los fps y el preprocesado:
+    `resize_res`, `mean` y `std`. `manifest.json` guarda, por id de video, su ruta, mtime, número de
+    frames y la fila del chunk donde empieza su primera ventana: la ventana
+    `i` de un video es la fila `start + i`. Como en AugmentedStore, solo se
+    apunta en el manifest lo que ya está en disco.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        artifact: str,
+        stride: int = 1,
+        fps: int = 16,
+        resize_res: int = 256,
+        mean: float = 0.5,
+        std: float = 1.0,
+    ) -> None:
+        with open(artifact, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        raw = json.dumps(
+            {
+                "artifact": digest,
+                "stride": stride,
+                "fps": fps,
+                "resize_res": resize_res,
+                "mean": mean,
+                "std": std,
+            },
+            sort_keys=True,
+        )
+
+        self.artifact: str = artifact
+        self.stride: int = stride
+        self.fps: int = fps
+        self.resize_res: int = resize_res
+        self.mean: float = mean
+        self.std: float = std
+        self.root: str = os.path.join(root, hashlib.sha1(raw.encode()).hexdigest()[:12])
+        self._manifest_path: str = os.path.join(self.root, "manifest.json")
+
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path) as f:
+                manifest = json.load(f)
+            self.num_in_frames: int = manifest["num_in_frames"]
+            self.chunks: list[str] = manifest["chunks"]
+            self.entries: dict[str, dict] = manifest["entries"]
+        else:
+            os.makedirs(self.root, exist_ok=True)
+            self.num_in_frames = 0
+            self.chunks = []
+            self.entries = {}
+
+        self._loaded: dict[tuple[int, str], np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self.entries
+
+    def _chunk(self, i: int, kind: str) -> np.ndarray:
+        if (i, kind) not in self._loaded:
+            file = os.path.join(self.root, f"{self.chunks[i]}.{kind}.npy")
+            self._loaded[(i, kind)] = np.load(file, mmap_mode="r")
+        return self._loaded[(i, kind)]
+
+    def __getitem__(self, key: str | tuple[str, int]) -> dict[str, np.ndarray]:
+        """Salidas de todas las ventanas de un video, o de `(id, ventana)`."""
+        video_id, window = key if isinstance(key, tuple) else (key, None)
+        entry = self.entries[video_id]
+        rows = slice(entry["start"], entry["start"] + entry["windows"])
+        if window is not None:
+            if not 0 <= window < entry["windows"]:
+                raise IndexError(f"El video {video_id} tiene {entry['windows']} ventanas")
+            rows = entry["start"] + window
+        return {kind: self._chunk(entry["chunk"], kind)[rows] for kind in ("embds", "logits")}
+
+    def t_mid(self, video_id: str) -> np.ndarray:
+        starts = window_starts(self.entries[video_id]["frames"], self.num_in_frames, self.stride)
+        return starts + self.num_in_frames / 2
+
+    def _save_manifest(self) -> None:
+        manifest = {
+            "artifact": os.path.abspath(self.artifact),
+            "stride": self.stride,
+            "fps": self.fps,
+            "resize_res": self.resize_res,
+            "mean": self.mean,
+            "std": self.std,
+            "num_in_frames": self.num_in_frames,
+            "chunks": self.chunks,
+            "entries": self.entries,
+        }
+        tmp = f"{self._manifest_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._manifest_path)
+
+    def _flush(self, videos: list[_Pending]) -> None:
+        name = f"chunk-{len(self.chunks):05d}"
+        for kind in ("embds", "logits"):
+            file = os.path.join(self.root, f"{name}.{kind}.npy")
+            tmp = f"{file}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, np.concatenate([getattr(video, kind) for video in videos]))
+            os.replace(tmp, file)
+
+        start = 0
+        for video in videos:
+            video.entry.update(chunk=len(self.chunks), start=start)
+            start += len(video.embds)
+            self.entries[video.entry.pop("id")] = video.entry
+        self.chunks.append(name)
+        self._save_manifest()
+
+    def extract(
+        self,
+        videos: dict[str, str],
+        chunk_bytes: int = 64 * 1024**2,
+        log: Callable[[str], None] | None = None,
+    ) -> int:
+        """Calcula las ventanas de los videos que faltan y devuelve cuántos se escribieron.
+
+        El preprocesado es el de `prepare_input` del notebook: redimensionado a
+        `resize_res`, recorte central al tamaño de la entrada del artefacto y
+        `(x / 255 - mean) / std`. El loader redimensiona con INTER_AREA. Las
+        ventanas de varios videos comparten batch, del tamaño fijo con el que
+        se exportó el artefacto: el del notebook es de 1, así que para lotes
+        grandes hay que exportarlo con `export_embedding_artifact`. Un video
+        cambiado (otro mtime) se recalcula.
+        """
+        model, shape = load_artifact(self.artifact)
+        batch_size, _, num_in_frames, height, width = shape
+        if self.num_in_frames not in (0, num_in_frames):
+            raise RuntimeError("El manifest no corresponde a la entrada del artefacto")
+        self.num_in_frames = num_in_frames
+
+        resize_res = self.resize_res
+        loader = RGBVideoLoader(fps=self.fps, size=(resize_res, resize_res))
+        top, left = (resize_res - height) // 2, (resize_res - width) // 2
+
+        pending_ids = [
+            video_id
+            for video_id, path in videos.items()
+            if self.entries.get(video_id, {}).get("mtime") != os.stat(path).st_mtime_ns
+        ]
+
+        clips = torch.empty(shape)
+        owners: list[tuple[_Pending, int]] = []
+        done: list[_Pending] = []
+        written = 0
+
+        def run() -> None:
+            with torch.no_grad():
+                outputs = model(clips.div_(255).sub_(self.mean).div_(self.std))
+            if "embds" not in outputs:
+                raise RuntimeError("El artefacto debe exportarse con include_embds=True")
+
+            embds = outputs["embds"].flatten(1).numpy()
+            logits = outputs["logits"].numpy()
+            for row, (video, window) in enumerate(owners):
+                if video.store(window, embds[row], logits[row]):
+                    done.append(video)
+            owners.clear()
+
+        for n, video_id in enumerate(pending_ids):
+            path = videos[video_id]
+            frames = torch.from_numpy(loader._load_video(path))
+            frames = frames[:, top : top + height, left : left + width]
+            if len(frames) < num_in_frames:
+                frames = frames[padded_indices(len(frames), num_in_frames)]
+
+            starts = window_starts(len(frames), num_in_frames, self.stride)
+            entry = {
+                "id": video_id,
+                "path": os.path.abspath(path),
+                "mtime": os.stat(path).st_mtime_ns,
+                "frames": len(frames),
+                "windows": len(starts),
+            }
+            video = _Pending(entry, len(starts))
+
+            for window, t in enumerate(starts.tolist()):
+                # (T, H, W, C) → (C, T, H, W), convirtiendo a float en el propio buffer
+                clips[len(owners)].copy_(frames[t : t + num_in_frames].permute(3, 0, 1, 2))
+                owners.append((video, window))
+                if len(owners) == batch_size:
+                    run()
+
+            if log is not None:
+                log(f"[{n + 1}/{len(pending_ids)}] {video_id}: {len(starts)} ventanas")
+
+            nbytes = sum(v.embds.nbytes + v.logits.nbytes for v in done)
+            if nbytes >= chunk_bytes:
+                self._flush(done)
+                written += len(done)
+                done.clear()
+
+        if owners:
+            run()
+        if done:
+            self._flush(done)
+            written += len(done)
+        return written
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Extrae embeddings y logits de I3D por ventana")
+    parser.add_argument("--artifact", required=True)
+    parser.add_argument("--weights", help="Exporta antes --artifact con estos pesos convertidos")
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--num-in-frames", type=int, default=16)
+    parser.add_argument("--num-classes", type=int, default=1064)
+    parser.add_argument("--videos", required=True)
+    parser.add_argument("--metadata", nargs="+")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--stride", type=int, default=1)
+    parser.add_argument("--fps", type=int, default=16)
+    parser.add_argument("--resize", type=int, default=256)
+    parser.add_argument("--chunk-bytes", type=int, default=64 * 1024**2)
+
+    args = parser.parse_args()
+    if args.weights:
+        export_embedding_artifact(
+            args.weights, args.artifact, args.batch, args.num_in_frames, args.num_classes
+        )
+
+    if args.metadata:
+        videos = videos_from_metadata(args.metadata, args.videos)
+    else:
+        videos = videos_from_dir(args.videos)
+
+    store = FeatureStore(args.out, args.artifact, args.stride, args.fps, args.resize)
+    written = store.extract(videos, args.chunk_bytes, log=print)
+    print(f"{written} videos nuevos, {len(store)} en total en {store.root}")
@@ -0,0 +1,138 @@
+from argparse import ArgumentParser
+from typing import Callable
+import json
+import statistics
+import time
+import zipfile
+import torch
+import torch.nn as nn
+from .checkpoint import load_model
+from .model import InceptionI3d
+
+FORMATS = ("export", "torchscript")
+
+
+def export_model(
+    model: nn.Module, path: str, example: torch.Tensor, format: str = "export"
+) -> None:
+    """Guarda `model` como artefacto de inferencia en CPU para entradas como `example`.
+
+    Con `export` se escribe un ExportedProgram (`.pt2`, `torch.export`); con
+    `torchscript`, una traza congelada con `torch.jit.freeze`. Ninguno de los
+    dos necesita la definición en Python del modelo para cargarse. La forma de
+    la entrada queda fija: conviene exportar el resultado de
+    `fuse_for_inference().plan_padding(example.shape)`.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Formato no válido: {format}; opciones: {list(FORMATS)}")
+
+    model = model.eval().to("cpu")
+    example = example.to("cpu")
+    signature = json.dumps({"shape": list(example.shape), "dtype": str(example.dtype)})
+
+    with torch.no_grad():
+        if format == "export":
+            program = torch.export.export(model, (example,))
+            torch.export.save(program, path, extra_files={"signature.json": signature})
+        else:
+            traced = torch.jit.freeze(torch.jit.trace(model, example, strict=False))
+            torch.jit.save(traced, path, _extra_files={"signature.json": signature})
+
+
+def load_artifact(path: str) -> tuple[Callable, tuple[int, ...]]:
+    """Carga un artefacto de `export_model` y devuelve el callable y la forma de entrada.
+
+    El grafo se exportó con el gradiente desactivado y puede contener
+    operaciones con `out=`, que autograd no admite: los parámetros del
+    ExportedProgram se cargan sin `requires_grad` para que se pueda llamar
+    fuera de `torch.no_grad()`.
+    """
+    files = {"signature.json": ""}
+    if path.endswith(".pt2"):
+        program = torch.export.load(path, extra_files=files)
+        model = program.module().requires_grad_(False)
+    else:
+        model = torch.jit.load(path, map_location="cpu", _extra_files=files)
+    return model, tuple(json.loads(files["signature.json"])["shape"])
+
+
+def signature(path: str) -> tuple[int, ...]:
+    """Forma de entrada de un artefacto leída de su `signature.json`, sin cargarlo.
+
+    Los dos formatos son un zip que guarda los archivos extra en
+    `<archivo>/extra/`.
+    """
+    with zipfile.ZipFile(path) as archive:
+        name = next(n for n in archive.namelist() if n.endswith("/extra/signature.json"))
+        return tuple(json.loads(archive.read(name))["shape"])
+
+
+def _latency(model: Callable, example: torch.Tensor, repeats: int) -> float:
+    times = []
+    with torch.no_grad():
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(example)
+            times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def _cold_start(load: Callable[[], Callable], example: torch.Tensor) -> tuple[Callable, float]:
+    """Tiempo hasta el primer resultado: carga más la primera inferencia."""
+    start = time.perf_counter()
+    model = load()
+    with torch.no_grad():
+        model(example)
+    return model, time.perf_counter() - start
+
+
+def benchmark(
+    path: str,
+    build: Callable[[], nn.Module] | None = None,
+    weights: str | None = None,
+    repeats: int = 5,
+) -> dict[str, dict[str, float]]:
+    """Arranque en frío y latencia estable del artefacto frente al modelo eager.
+
+    El modelo eager se construye con `build` (y los pesos de `weights` con
+    `load_model`, si se dan); sin `build` solo se mide el artefacto. Ambos
+    se miden en este proceso, con torch ya importado; la forma de la entrada
+    se lee con `signature` para no cargar el artefacto antes de medirlo. La
+    latencia es la mediana de `repeats` pasadas tras la primera.
+    """
+    example = torch.randn(signature(path))
+
+    candidates: dict[str, Callable[[], Callable]] = {"artifact": lambda: load_artifact(path)[0]}
+    if build is not None:
+        candidates["eager"] = (
+            (lambda: build().eval()) if weights is None else (lambda: load_model(build, weights))
+        )
+
+    results = {}
+    for name, load in candidates.items():
+        model, cold = _cold_start(load, example)
+        results[name] = {"cold_start_s": cold, "latency_s": _latency(model, example, repeats)}
+    return results
+
+
+def format_benchmark(results: dict[str, dict[str, float]]) -> str:
+    lines = [f"{'modelo':<10}{'frío (s)':>12}{'latencia (s)':>14}"]
+    for name, result in results.items():
+        lines.append(f"{name:<10}{result['cold_start_s']:>12.3f}{result['latency_s']:>14.3f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Arranque en frío y latencia de un artefacto de I3D")
+    parser.add_argument("--artifact", required=True)
+    parser.add_argument("--weights", help="Pesos convertidos para comparar con el modelo eager")
+    parser.add_argument("--num-classes", type=int, default=1064)
+    parser.add_argument("--repeats", type=int, default=5)
+
+    args = parser.parse_args()
+    build = None
+    if args.weights:
+        # Como en el notebook, con los frames de la entrada del artefacto
+        num_in_frames = signature(args.artifact)[2]
+        build = lambda: InceptionI3d(num_classes=args.num_classes, num_in_frames=num_in_frames)
+    print(format_benchmark(benchmark(args.artifact, build, args.weights, args.repeats)))
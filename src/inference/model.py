@@ -0,0 +1,470 @@
+import copy
+import math
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from .checkpoint import remap_state_dict
+
+__all__ = ["InceptionI3d"]
+
+
+class MaxPool3dSamePadding(nn.MaxPool3d):
+    # (forma T, H, W de la entrada, padding explícito restante) fijados por plan_padding
+    _plan = None
+
+    def compute_pad(self, dim, s):
+        if s % self.stride[dim] == 0:
+            return max(self.kernel_size[dim] - self.stride[dim], 0)
+        else:
+            return max(self.kernel_size[dim] - (s % self.stride[dim]), 0)
+
+    def same_pad(self, x):
+        """Padding SAME de TensorFlow para la entrada `x`, en el orden de F.pad."""
+        (batch, channel, t, h, w) = x.size()
+        pad_t = self.compute_pad(0, t)
+        pad_h = self.compute_pad(1, h)
+        pad_w = self.compute_pad(2, w)
+
+        pad_t_f = pad_t // 2
+        pad_t_b = pad_t - pad_t_f
+        pad_h_f = pad_h // 2
+        pad_h_b = pad_h - pad_h_f
+        pad_w_f = pad_w // 2
+        pad_w_b = pad_w - pad_w_f
+
+        return (pad_w_f, pad_w_b, pad_h_f, pad_h_b, pad_t_f, pad_t_b)
+
+    def pad_input(self, x):
+        """Aplica el padding SAME que no hace ya la propia conv o pool."""
+        if self._plan is None:
+            return F.pad(x, self.same_pad(x))
+
+        shape, residual = self._plan
+        if tuple(x.shape[2:]) != shape:
+            raise ValueError(
+                f"El plan de padding es para entradas {shape}, no {tuple(x.shape[2:])}"
+            )
+        return x if residual is None else F.pad(x, residual)
+
+    def forward(self, x):
+        x = self.pad_input(x)
+        return super(MaxPool3dSamePadding, self).forward(x)
+
+
+class Unit3D(nn.Module):
+    _plan = None
+
+    def __init__(self, in_channels, output_channels, kernel_shape=(1, 1, 1),
+                 stride=(1, 1, 1), activation_fn=F.relu, use_batch_norm=True,
+                 use_bias=False):
+        super(Unit3D, self).__init__()
+
+        self._output_channels = output_channels
+        self._kernel_shape = kernel_shape
+        self._stride = stride
+        self._use_batch_norm = use_batch_norm
+        self._activation_fn = activation_fn
+        self._use_bias = use_bias
+
+        self.conv3d = nn.Conv3d(
+            in_channels=in_channels,
+            out_channels=self._output_channels,
+            kernel_size=self._kernel_shape,
+            stride=self._stride,
+            padding=0,
+            bias=self._use_bias,
+        )
+
+        if self._use_batch_norm:
+            self.bn = nn.BatchNorm3d(self._output_channels, eps=0.001, momentum=0.01)
+
+    def compute_pad(self, dim, s):
+        if s % self._stride[dim] == 0:
+            return max(self._kernel_shape[dim] - self._stride[dim], 0)
+        else:
+            return max(self._kernel_shape[dim] - (s % self._stride[dim]), 0)
+
+    same_pad = MaxPool3dSamePadding.same_pad
+    pad_input = MaxPool3dSamePadding.pad_input
+
+    def forward(self, x):
+        x = self.pad_input(x)
+        x = self.conv3d(x)
+
+        if self._use_batch_norm:
+            x = self.bn(x)
+        if self._activation_fn is not None:
+            x = self._activation_fn(x)
+        return x
+
+
+class FusedUnit3D(Unit3D):
+    """Unit3D de inferencia: la BatchNorm va plegada en los pesos y el sesgo de la conv.
+
+    Con la BN en modo eval, `bn(conv(x)) = conv(x) * s + (beta - mean * s)`
+    con `s = gamma / sqrt(var + eps)`, así que basta escalar cada filtro y
+    ajustar el sesgo. La ReLU se aplica in situ sobre la salida de la conv.
+    """
+
+    def __init__(self, unit):
+        conv = unit.conv3d
+        super(FusedUnit3D, self).__init__(
+            conv.in_channels, unit._output_channels,
+            kernel_shape=unit._kernel_shape, stride=unit._stride,
+            activation_fn=unit._activation_fn, use_batch_norm=False, use_bias=True,
+        )
+
+        with torch.no_grad():
+            weight = conv.weight
+            bias = conv.bias if conv.bias is not None else torch.zeros_like(weight[:, 0, 0, 0, 0])
+            if unit._use_batch_norm:
+                bn = unit.bn
+                scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+                weight = weight * scale.view(-1, 1, 1, 1, 1)
+                bias = (bias - bn.running_mean) * scale + bn.bias
+            self.conv3d.weight.copy_(weight)
+            self.conv3d.bias.copy_(bias)
+
+    def forward(self, x, out=None):
+        """Con `out`, el resultado se escribe en ese tensor (p. ej. un corte de canales)."""
+        x = self.conv3d(self.pad_input(x))
+        if self._activation_fn is F.relu and out is None:
+            return F.relu(x, inplace=True)
+        # Las funciones con out=... no admiten autograd
+        if self._activation_fn is F.relu and not torch.is_grad_enabled():
+            return torch.clamp_min(x, 0, out=out)
+        if self._activation_fn is not None:
+            x = self._activation_fn(x)
+        return x if out is None else out.copy_(x)
+
+
+class Uint8Unit3D(FusedUnit3D):
+    """Primer Unit3D para clips uint8 sin normalizar, con la normalización plegada.
+
+    `conv((x / 255 - mean) / std)` es una conv sobre `x` con los pesos de
+    cada canal de entrada divididos por `255 * std` y el sesgo reducido en
+    `sum(w * mean / std)`. El 0 del padding SAME en la entrada normalizada
+    vale `255 * mean` sin normalizar, así que pad_input rellena con ese valor
+    por canal a la vez que convierte a float. La BN, si la hay, también se
+    pliega como en FusedUnit3D.
+    """
+
+    def __init__(self, unit, mean, std):
+        super(Uint8Unit3D, self).__init__(unit)
+
+        mean = torch.as_tensor(mean, dtype=torch.float32).view(1, -1, 1, 1, 1)
+        std = torch.as_tensor(std, dtype=torch.float32).view(1, -1, 1, 1, 1)
+        with torch.no_grad():
+            weight = self.conv3d.weight
+            self.conv3d.bias.sub_((weight * (mean / std)).sum((1, 2, 3, 4)))
+            weight.div_(255 * std)
+        self.register_buffer("fill", 255 * mean.flatten())
+
+    def pad_input(self, x):
+        """Padding SAME con el valor de la media, ignorando cualquier plan."""
+        (pad_w_f, pad_w_b, pad_h_f, pad_h_b, pad_t_f, pad_t_b) = self.same_pad(x)
+        (batch, channel, t, h, w) = x.size()
+        padded = torch.empty(
+            batch, channel, t + pad_t_f + pad_t_b, h + pad_h_f + pad_h_b, w + pad_w_f + pad_w_b,
+            dtype=self.conv3d.weight.dtype, device=x.device,
+        )
+        padded.copy_(self.fill.view(1, -1, 1, 1, 1).expand_as(padded))
+        padded[:, :, pad_t_f:pad_t_f + t, pad_h_f:pad_h_f + h, pad_w_f:pad_w_f + w] = x
+        return padded
+
+
+class FusedInceptionModule(nn.Module):
+    """InceptionModule de inferencia sobre unidades ya fusionadas.
+
+    `b0`, `b1a` y `b2a` son convs 1x1x1 sobre la misma entrada: se concatenan
+    en una sola conv puntual cuya salida se reparte por canales. Cada rama
+    escribe su activación directamente en su corte del tensor de salida, sin
+    `torch.cat`.
+    """
+
+    def __init__(self, module):
+        super(FusedInceptionModule, self).__init__()
+
+        pointwise = [module.b0, module.b1a, module.b2a]
+        self._splits = [unit._output_channels for unit in pointwise]
+        self.pointwise = nn.Conv3d(
+            pointwise[0].conv3d.in_channels, sum(self._splits), kernel_size=1, bias=True
+        )
+        with torch.no_grad():
+            self.pointwise.weight.copy_(torch.cat([unit.conv3d.weight for unit in pointwise]))
+            self.pointwise.bias.copy_(torch.cat([unit.conv3d.bias for unit in pointwise]))
+
+        self.b1b = module.b1b
+        self.b2b = module.b2b
+        self.b3a = module.b3a
+        self.b3b = module.b3b
+        self._out_channels = (
+            self._splits[0] + self.b1b._output_channels
+            + self.b2b._output_channels + self.b3b._output_channels
+        )
+
+    def forward(self, x):
+        merged = F.relu(self.pointwise(x), inplace=True)
+        b0, b1, b2 = torch.split(merged, self._splits, dim=1)
+
+        (batch, _, t, h, w) = merged.shape
+        out = merged.new_empty(batch, self._out_channels, t, h, w)
+        c0 = self._splits[0]
+        c1 = c0 + self.b1b._output_channels
+        c2 = c1 + self.b2b._output_channels
+
+        out[:, :c0] = b0
+        self.b1b(b1, out=out[:, c0:c1])
+        self.b2b(b2, out=out[:, c1:c2])
+        self.b3b(self.b3a(x), out=out[:, c2:])
+        return out
+
+
+def plan_module_padding(module, shape):
+    """Fija el padding de un Unit3D o MaxPool3dSamePadding para entradas `(T, H, W)`.
+
+    La parte simétrica del padding SAME pasa al `padding=` de la conv o del
+    pool; solo el sobrante asimétrico (un elemento al final) sigue
+    necesitando F.pad. El pool rellena con -inf y F.pad con 0: es
+    equivalente porque en I3D todo MaxPool va tras una ReLU (entrada >= 0).
+    """
+    if isinstance(module, Uint8Unit3D):
+        # Su padding no es 0: lo pone siempre pad_input
+        return
+
+    target = module.conv3d if isinstance(module, Unit3D) else module
+    if shape is None:
+        module._plan = None
+        target.padding = 0
+        return
+
+    pad = module.same_pad(torch.empty(0, 0, *shape, device="meta"))
+    # F.pad va de la última dimensión a la primera: (w_f, w_b, h_f, h_b, t_f, t_b)
+    symmetric = tuple(min(pad[2 * d], pad[2 * d + 1]) for d in (2, 1, 0))
+    residual = tuple(p - symmetric[2 - i // 2] for i, p in enumerate(pad))
+    target.padding = symmetric
+    module._plan = (tuple(shape), residual if any(residual) else None)
+
+
+def convert_modules(module, convert):
+    """Sustituye in situ cada submódulo para el que `convert` devuelve otro módulo."""
+    for name, child in module.named_children():
+        new = convert(child)
+        if new is None:
+            convert_modules(child, convert)
+        else:
+            setattr(module, name, new)
+    return module
+
+
+class InceptionModule(nn.Module):
+    def __init__(self, in_channels, out_channels):
+        super(InceptionModule, self).__init__()
+
+        # Branch 0: 1x1x1 conv
+        self.b0 = Unit3D(in_channels, out_channels[0], kernel_shape=[1, 1, 1])
+
+        # Branch 1: 1x1x1 conv -> 3x3x3 conv
+        self.b1a = Unit3D(in_channels, out_channels[1], kernel_shape=[1, 1, 1])
+        self.b1b = Unit3D(out_channels[1], out_channels[2], kernel_shape=[3, 3, 3])
+
+        # Branch 2: 1x1x1 conv -> 3x3x3 conv
+        self.b2a = Unit3D(in_channels, out_channels[3], kernel_shape=[1, 1, 1])
+        self.b2b = Unit3D(out_channels[3], out_channels[4], kernel_shape=[3, 3, 3])
+
+        # Branch 3: MaxPool -> 1x1x1 conv
+        self.b3a = MaxPool3dSamePadding(kernel_size=[3, 3, 3], stride=(1, 1, 1), padding=0)
+        self.b3b = Unit3D(in_channels, out_channels[5], kernel_shape=[1, 1, 1])
+
+    def forward(self, x):
+        b0 = self.b0(x)
+        b1 = self.b1b(self.b1a(x))
+        b2 = self.b2b(self.b2a(x))
+        b3 = self.b3b(self.b3a(x))
+        return torch.cat([b0, b1, b2, b3], dim=1)
+
+
+class InceptionI3d(nn.Module):
+    """I3D: Inflated 3D ConvNet para clasificación de videos."""
+
+    def __init__(self, num_classes=400, spatiotemporal_squeeze=True,
+                 in_channels=3, dropout_keep_prob=0.5, num_in_frames=64,
+                 include_embds=False):
+        super().__init__()
+
+        self._num_classes = num_classes
+        self._in_channels = in_channels
+        self._num_in_frames = num_in_frames
+        self._spatiotemporal_squeeze = spatiotemporal_squeeze
+        self.include_embds = include_embds
+
+        # Configuración de la arquitectura (más compacto)
+        # Stem
+        self.stem = nn.Sequential(
+            Unit3D(in_channels, 64, kernel_shape=[7, 7, 7], stride=(2, 2, 2)),
+            MaxPool3dSamePadding(kernel_size=[1, 3, 3], stride=(1, 2, 2), padding=0),
+            Unit3D(64, 64, kernel_shape=[1, 1, 1]),
+            Unit3D(64, 192, kernel_shape=[3, 3, 3]),
+            MaxPool3dSamePadding(kernel_size=[1, 3, 3], stride=(1, 2, 2), padding=0),
+        )
+
+        # Inception modules (organizados por bloques)
+        self.inception_3 = nn.Sequential(
+            InceptionModule(192, [64, 96, 128, 16, 32, 32]),   # 3b: 256
+            InceptionModule(256, [128, 128, 192, 32, 96, 64]),  # 3c: 480
+        )
+
+        self.pool_4a = MaxPool3dSamePadding(kernel_size=[3, 3, 3], stride=(2, 2, 2), padding=0)
+
+        self.inception_4 = nn.Sequential(
+            InceptionModule(480, [192, 96, 208, 16, 48, 64]),   # 4b: 512
+            InceptionModule(512, [160, 112, 224, 24, 64, 64]),  # 4c: 512
+            InceptionModule(512, [128, 128, 256, 24, 64, 64]),  # 4d: 512
+            InceptionModule(512, [112, 144, 288, 32, 64, 64]),  # 4e: 528
+            InceptionModule(528, [256, 160, 320, 32, 128, 128]), # 4f: 832
+        )
+
+        self.pool_5a = MaxPool3dSamePadding(kernel_size=[2, 2, 2], stride=(2, 2, 2), padding=0)
+
+        self.inception_5 = nn.Sequential(
+            InceptionModule(832, [256, 160, 320, 32, 128, 128]), # 5b: 832
+            InceptionModule(832, [384, 192, 384, 48, 128, 128]), # 5c: 1024
+        )
+
+        # Head
+        last_duration = int(math.ceil(num_in_frames / 8))
+        last_size = 7
+        self.avgpool = nn.AvgPool3d((last_duration, last_size, last_size), stride=1)
+        self.dropout = nn.Dropout(dropout_keep_prob)
+        self.logits = Unit3D(1024, self._num_classes, kernel_shape=[1, 1, 1],
+                            activation_fn=None, use_batch_norm=False, use_bias=True)
+
+    def forward(self, x):
+        x = self.stem(x)
+        x = self.inception_3(x)
+        x = self.pool_4a(x)
+        x = self.inception_4(x)
+        x = self.pool_5a(x)
+        x = self.inception_5(x)
+
+        embds = self.dropout(self.avgpool(x))
+        x = self.logits(embds)
+
+        if self._spatiotemporal_squeeze:
+            logits = x.squeeze(3).squeeze(3).squeeze(2)
+
+        if self.include_embds:
+            return {"logits": logits, "embds": embds}
+        else:
+            return {"logits": logits}
+
+    def example_input(self, batch=1):
+        return torch.randn(batch, self._in_channels, self._num_in_frames, 224, 224)
+
+    def check_equivalent(self, converted, example=None, rtol=1e-4, converted_example=None):
+        """Compara los logits de un modelo convertido con los de este modelo.
+
+        Devuelve el error máximo y lanza RuntimeError si supera `rtol` veces
+        la magnitud de los logits de referencia. Si el modelo convertido
+        espera otra entrada, `converted_example` es la equivalente a `example`.
+        """
+        example = self.example_input() if example is None else example
+        converted_example = example if converted_example is None else converted_example
+        training = self.training
+        self.eval()
+        with torch.no_grad():
+            expected = self(example)["logits"]
+            got = converted(converted_example)["logits"]
+        self.train(training)
+
+        error = (expected - got).abs().max().item()
+        if error > rtol * max(expected.abs().max().item(), 1.0):
+            raise RuntimeError(
+                f"El modelo convertido difiere del original: error máximo {error:.3e}"
+            )
+        return error
+
+    def fuse_for_inference(self, example=None, verify=True, merge_branches=True):
+        """Copia del modelo para inferencia con cada BatchNorm plegada en su conv.
+
+        Con `merge_branches`, las tres convs 1x1x1 de cada InceptionModule se
+        unen en una (FusedInceptionModule). Si `verify`, comprueba la
+        equivalencia numérica con este modelo sobre `example` (por defecto,
+        un clip aleatorio de `num_in_frames` frames).
+        """
+        fused = copy.deepcopy(self).eval()
+        convert_modules(
+            fused, lambda m: FusedUnit3D(m) if type(m) is Unit3D else None
+        )
+        if merge_branches:
+            convert_modules(
+                fused,
+                lambda m: FusedInceptionModule(m) if type(m) is InceptionModule else None,
+            )
+
+        if verify:
+            self.check_equivalent(fused, example)
+        return fused
+
+    def for_uint8_input(self, mean=0.5 * torch.ones(3), std=1.0 * torch.ones(3), verify=True):
+        """Copia del modelo que recibe clips uint8 `(B, 3, T, H, W)` sin normalizar.
+
+        `/255`, `mean` y `std` (los de `prepare_input`) se pliegan en la conv
+        del primer Unit3D (Uint8Unit3D); el resto del modelo no cambia. Se
+        puede combinar con fuse_for_inference y plan_padding. Si `verify`,
+        compara con este modelo sobre un clip uint8 aleatorio.
+        """
+        folded = copy.deepcopy(self).eval()
+        folded.stem[0] = Uint8Unit3D(folded.stem[0], mean, std)
+
+        if verify:
+            raw = torch.randint(0, 256, self.example_input().shape, dtype=torch.uint8)
+            normalized = (raw / 255 - mean.view(1, -1, 1, 1, 1)) / std.view(1, -1, 1, 1, 1)
+            self.check_equivalent(folded, normalized, converted_example=raw)
+        return folded
+
+    def plan_padding(self, input_shape, verify=True):
+        """Especializa el padding de cada capa para entradas de forma `input_shape`.
+
+        Las formas intermedias se obtienen con una pasada sobre el device
+        `meta`, sin calcular nada. Con el plan fijado, una entrada de otra
+        forma lanza ValueError; `plan_padding(None)` vuelve al padding
+        dinámico. Modifica el modelo y lo devuelve.
+        """
+        planned = (Unit3D, MaxPool3dSamePadding)
+        for module in self.modules():
+            if isinstance(module, planned):
+                plan_module_padding(module, None)
+        if input_shape is None:
+            return self
+
+        reference = copy.deepcopy(self) if verify else None
+        shapes = {}
+        tracer = copy.deepcopy(self).to("meta")
+        for name, module in tracer.named_modules():
+            if isinstance(module, planned):
+                module.register_forward_pre_hook(
+                    lambda m, args, name=name: shapes.__setitem__(name, tuple(args[0].shape[2:]))
+                )
+        with torch.no_grad():
+            tracer(torch.empty(input_shape, device="meta"))
+
+        for name, module in self.named_modules():
+            if name in shapes:
+                plan_module_padding(module, shapes[name])
+
+        if verify:
+            reference.check_equivalent(self, torch.randn(input_shape))
+        return self
+
+    def load_old_state_dict(self, old_state_dict):
+        """Carga un state_dict del modelo original (verboso) al simplificado.
+
+        Para arrancar varios procesos conviene convertir el checkpoint una vez
+        con `python -m inference.checkpoint` y cargarlo con `load_model`.
+        """
+        new_state_dict = remap_state_dict(old_state_dict)
+
+        # Cargar el state_dict mapeado
+        self.load_state_dict(new_state_dict, strict=True)
+        return self
@@ -0,0 +1,182 @@
+from typing import Iterable
+import copy
+import time
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.ao import quantization
+
+
+def _same_pad(kernel: tuple, stride: tuple, shape: tuple) -> tuple[int, ...]:
+    """Padding SAME de TensorFlow para una entrada `(T, H, W)`, en el orden de F.pad."""
+    pads: list[int] = []
+    for k, s, size in reversed(list(zip(kernel, stride, shape))):
+        pad = max(k - s, 0) if size % s == 0 else max(k - size % s, 0)
+        pads += [pad // 2, pad - pad // 2]
+    return tuple(pads)
+
+
+class QuantizedUnit3D(nn.Module):
+    """Unit3D entre QuantStub y DeQuantStub para cuantización estática eager.
+
+    El padding SAME se aplica en float antes de cuantizar: rellenar un tensor
+    cuantizado con 0 rellenaría con `-zero_point * scale`. Conv, BN y ReLU
+    quedan como submódulos separados para que `fuse_modules` los pliegue en
+    una sola conv int8.
+    """
+
+    def __init__(self, unit: nn.Module) -> None:
+        super().__init__()
+        self._kernel_shape: tuple = tuple(unit._kernel_shape)
+        self._stride: tuple = tuple(unit._stride)
+
+        conv = unit.conv3d
+        self.quant = quantization.QuantStub()
+        self.conv = nn.Conv3d(
+            conv.in_channels,
+            conv.out_channels,
+            conv.kernel_size,
+            conv.stride,
+            bias=conv.bias is not None,
+        )
+        self.conv.load_state_dict(conv.state_dict())
+        self.bn = copy.deepcopy(unit.bn) if unit._use_batch_norm else None
+        if unit._activation_fn is F.relu:
+            self.relu = nn.ReLU()
+        elif unit._activation_fn is None:
+            self.relu = None
+        else:
+            raise ValueError(f"Activación no cuantizable: {unit._activation_fn}")
+        self.dequant = quantization.DeQuantStub()
+
+    def fusable(self) -> list[str]:
+        return [name for name in ("conv", "bn", "relu") if getattr(self, name) is not None]
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x = F.pad(x, _same_pad(self._kernel_shape, self._stride, tuple(x.shape[2:])))
+        x = self.conv(self.quant(x))
+        if self.bn is not None:
+            x = self.bn(x)
+        if self.relu is not None:
+            x = self.relu(x)
+        return self.dequant(x)
+
+
+def _wrap_units(module: nn.Module, skip: nn.Module | None) -> None:
+    for name, child in module.named_children():
+        if hasattr(child, "pointwise"):
+            raise ValueError(
+                "Las ramas fusionadas no se cuantizan: usa el modelo sin fuse_for_inference"
+            )
+        if child is skip:
+            continue
+        if hasattr(child, "conv3d"):
+            setattr(module, name, QuantizedUnit3D(child))
+        else:
+            _wrap_units(child, skip)
+
+
+def prepare_int8(
+    model: nn.Module, backend: str = "x86", include_logits: bool = False
+) -> nn.Module:
+    """Copia de `model` con cada Unit3D preparado para calibrar.
+
+    Los MaxPool, las concatenaciones y el avgpool siguen en float entre
+    bloques. La capa de logits se queda en float salvo con `include_logits`:
+    es la más sensible y apenas pesa en el tiempo total.
+    """
+    torch.backends.quantized.engine = backend
+    prepared = copy.deepcopy(model)
+    _wrap_units(prepared, None if include_logits else prepared.logits)
+    prepared.eval()
+
+    for unit in prepared.modules():
+        if isinstance(unit, QuantizedUnit3D):
+            if len(unit.fusable()) > 1:
+                quantization.fuse_modules(unit, [unit.fusable()], inplace=True)
+            unit.qconfig = quantization.get_default_qconfig(backend)
+    return quantization.prepare(prepared)
+
+
+def calibrate(prepared: nn.Module, clips: Iterable[torch.Tensor]) -> int:
+    """Pasa clips `(B, C, T, H, W)` por los observadores y devuelve cuántos se vieron."""
+    seen = 0
+    with torch.no_grad():
+        for clip in clips:
+            prepared(clip)
+            seen += clip.shape[0]
+    if seen == 0:
+        raise ValueError("Hace falta al menos un clip de calibración")
+    return seen
+
+
+def convert_int8(prepared: nn.Module) -> nn.Module:
+    return quantization.convert(prepared)
+
+
+def quantize_int8(
+    model: nn.Module,
+    clips: Iterable[torch.Tensor],
+    backend: str = "x86",
+    include_logits: bool = False,
+) -> nn.Module:
+    prepared = prepare_int8(model, backend, include_logits)
+    calibrate(prepared, clips)
+    return convert_int8(prepared)
+
+
+def export_int8(model: nn.Module, path: str, example: torch.Tensor) -> None:
+    """Guarda el modelo int8 como TorchScript: se carga con `torch.jit.load`."""
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example, strict=False)
+    torch.jit.save(traced, path)
+
+
+def _timed_logits(model: nn.Module, clip: torch.Tensor) -> tuple[torch.Tensor, float]:
+    start = time.perf_counter()
+    with torch.no_grad():
+        logits = model(clip)["logits"]
+    return logits, time.perf_counter() - start
+
+
+def agreement_report(
+    reference: nn.Module, quantized: nn.Module, clips: Iterable[torch.Tensor], k: int = 5
+) -> dict[str, float]:
+    """Coincidencia top-1/top-k del modelo int8 con el float y latencia de ambos.
+
+    `top1` es la fracción de clips con la misma clase más probable; `top5`,
+    la fracción media de clases compartidas entre los dos top-k. Los tiempos
+    son por clip, con cada modelo sobre los mismos tensores.
+    """
+    matches = overlap = total = 0
+    fp32_seconds = int8_seconds = 0.0
+    for clip in clips:
+        expected, seconds = _timed_logits(reference, clip)
+        fp32_seconds += seconds
+        got, seconds = _timed_logits(quantized, clip)
+        int8_seconds += seconds
+
+        matches += int((expected.argmax(1) == got.argmax(1)).sum())
+        top_expected = expected.topk(k, dim=1).indices
+        top_got = got.topk(k, dim=1).indices
+        overlap += int((top_expected.unsqueeze(2) == top_got.unsqueeze(1)).any(2).sum())
+        total += clip.shape[0]
+
+    if total == 0:
+        raise ValueError("Hace falta al menos un clip para comparar")
+
+    return {
+        "clips": total,
+        "top1": matches / total,
+        f"top{k}": overlap / (k * total),
+        "fp32_ms": 1e3 * fp32_seconds / total,
+        "int8_ms": 1e3 * int8_seconds / total,
+        "speedup": fp32_seconds / int8_seconds,
+    }
+
+
+def format_report(report: dict[str, float]) -> str:
+    return "\n".join(
+        f"{name:<10}{value:>10.3f}" if isinstance(value, float) else f"{name:<10}{value:>10}"
+        for name, value in report.items()
+    )
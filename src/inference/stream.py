@@ -0,0 +1,328 @@
+from typing import Callable
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+# Frames de entrada por cada frame temporal a la salida de inception_5
+TEMPORAL_STRIDE = 8
+
+
+def _cat(a: torch.Tensor | None, b: torch.Tensor | None) -> torch.Tensor | None:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return torch.cat([a, b], dim=2)
+
+
+def _spatial_pad(
+    module: nn.Module, x: torch.Tensor, fill: torch.Tensor | None = None
+) -> torch.Tensor:
+    """Padding SAME solo en alto y ancho; el temporal lo pone el buffer.
+
+    Con `fill` se rellena con ese valor por canal en lugar de con ceros.
+    """
+    pads = []
+    for dim, size in ((2, x.shape[4]), (1, x.shape[3])):
+        pad = module.compute_pad(dim, size)
+        pads += [pad // 2, pad - pad // 2]
+    if fill is None:
+        return F.pad(x, (*pads, 0, 0))
+    # F.pad solo admite un valor: se rellena con ceros alrededor de x - fill
+    fill = fill.view(1, -1, 1, 1, 1)
+    return F.pad(x - fill, (*pads, 0, 0)) + fill
+
+
+class _Temporal:
+    """Operación con ventana temporal `kernel` y paso `stride` sobre un flujo de frames.
+
+    Guarda los frames que aún hacen falta para la siguiente salida. Con `same`
+    el flujo empieza con el relleno frontal del padding SAME y `flush` añade el
+    trasero hasta emitir `ceil(T / stride)` salidas; sin él solo se emiten
+    ventanas completas. `op` recibe exactamente los frames que cubren las
+    salidas y no debe rellenar en el tiempo. Con `fill` el relleno temporal
+    vale eso por canal en lugar de 0, y la entrada se pasa a su dtype.
+    """
+
+    def __init__(
+        self,
+        kernel: int,
+        stride: int,
+        op: Callable[[torch.Tensor], torch.Tensor],
+        same: bool = True,
+        fill: torch.Tensor | None = None,
+    ) -> None:
+        self.kernel: int = kernel
+        self.stride: int = stride
+        self.op: Callable[[torch.Tensor], torch.Tensor] = op
+        self.same: bool = same
+        self.fill: torch.Tensor | None = fill
+        # El de una entrada de longitud múltiplo de stride
+        self.front: int = max(kernel - stride, 0) // 2 if same else 0
+        self.reset()
+
+    def reset(self) -> None:
+        self.buffer: torch.Tensor | None = None
+        self.seen: int = 0
+        self.emitted: int = 0
+
+    def _pad(self, like: torch.Tensor, frames: int) -> torch.Tensor:
+        shape = (*like.shape[:2], frames, *like.shape[3:])
+        if self.fill is None:
+            return like.new_zeros(shape)
+        return self.fill.view(1, -1, 1, 1, 1).expand(shape)
+
+    def _run(self, count: int) -> torch.Tensor:
+        used = (count - 1) * self.stride + self.kernel
+        y = self.op(self.buffer[:, :, :used])
+        self.buffer = self.buffer[:, :, count * self.stride :]
+        self.emitted += count
+        return y
+
+    def push(self, x: torch.Tensor) -> torch.Tensor | None:
+        if self.fill is not None:
+            x = x.to(self.fill.dtype)
+        if self.buffer is None:
+            self.buffer = torch.cat([self._pad(x, self.front), x], dim=2)
+        else:
+            self.buffer = torch.cat([self.buffer, x], dim=2)
+        self.seen += x.shape[2]
+
+        count = (self.buffer.shape[2] - self.kernel) // self.stride + 1
+        return self._run(count) if count > 0 else None
+
+    def flush(self) -> torch.Tensor | None:
+        if self.buffer is None or not self.same:
+            return None
+
+        count = -(-self.seen // self.stride) - self.emitted
+        if count <= 0:
+            return None
+        missing = (count - 1) * self.stride + self.kernel - self.buffer.shape[2]
+        if missing > 0:
+            self.buffer = torch.cat([self.buffer, self._pad(self.buffer, missing)], dim=2)
+        return self._run(count)
+
+
+class _Sequence:
+    def __init__(self, nodes: list) -> None:
+        self.nodes: list = nodes
+
+    def reset(self) -> None:
+        for node in self.nodes:
+            node.reset()
+
+    def push(self, x: torch.Tensor) -> torch.Tensor | None:
+        for node in self.nodes:
+            x = node.push(x)
+            if x is None:
+                return None
+        return x
+
+    def flush(self) -> torch.Tensor | None:
+        # Lo que suelta cada nodo al cerrar aún tiene que atravesar los siguientes
+        x = None
+        for node in self.nodes:
+            x = _cat(node.push(x) if x is not None else None, node.flush())
+        return x
+
+
+class _Inception:
+    """Ramas de un InceptionModule (o FusedInceptionModule) en flujo.
+
+    Las ramas con conv o pool 3x3x3 emiten cada frame uno más tarde que la
+    conv puntual, así que se encolan y solo se concatena el tramo común.
+    """
+
+    def __init__(self, module: nn.Module) -> None:
+        self.pointwise: nn.Conv3d | None = getattr(module, "pointwise", None)
+        if self.pointwise is None:
+            self.branches: list[_Sequence] = [
+                _Sequence([_unit(module.b0)]),
+                _Sequence([_unit(module.b1a), _unit(module.b1b)]),
+                _Sequence([_unit(module.b2a), _unit(module.b2b)]),
+                _Sequence([_pool(module.b3a), _unit(module.b3b)]),
+            ]
+        else:
+            # La conv puntual fusionada no tiene estado: solo b1b, b2b y b3 lo guardan
+            self._splits: list[int] = module._splits
+            self.branches = [
+                _Sequence([]),
+                _Sequence([_unit(module.b1b)]),
+                _Sequence([_unit(module.b2b)]),
+                _Sequence([_pool(module.b3a), _unit(module.b3b)]),
+            ]
+        self.reset()
+
+    def reset(self) -> None:
+        for branch in self.branches:
+            branch.reset()
+        self.queues: list[torch.Tensor | None] = [None] * len(self.branches)
+
+    def _emit(self, outputs: list[torch.Tensor | None]) -> torch.Tensor | None:
+        self.queues = [_cat(queue, y) for queue, y in zip(self.queues, outputs)]
+        ready = min(0 if queue is None else queue.shape[2] for queue in self.queues)
+        if ready == 0:
+            return None
+
+        y = torch.cat([queue[:, :, :ready] for queue in self.queues], dim=1)
+        self.queues = [
+            queue[:, :, ready:] if queue.shape[2] > ready else None for queue in self.queues
+        ]
+        return y
+
+    def push(self, x: torch.Tensor) -> torch.Tensor | None:
+        if self.pointwise is None:
+            inputs = [x] * len(self.branches)
+        else:
+            merged = F.relu(self.pointwise(x), inplace=True)
+            inputs = [*torch.split(merged, self._splits, dim=1), x]
+        return self._emit([branch.push(part) for branch, part in zip(self.branches, inputs)])
+
+    def flush(self) -> torch.Tensor | None:
+        return self._emit([branch.flush() for branch in self.branches])
+
+
+def _unit(module: nn.Module) -> _Temporal:
+    """Unit3D (o FusedUnit3D): conv sin padding temporal, BN y activación.
+
+    Un Uint8Unit3D (`for_uint8_input`) rellena con su `fill` por canal, el 0
+    de la entrada normalizada.
+    """
+    conv = module.conv3d
+    fill = getattr(module, "fill", None)
+
+    def op(x: torch.Tensor) -> torch.Tensor:
+        x = F.conv3d(_spatial_pad(module, x, fill), conv.weight, conv.bias, conv.stride)
+        if module._use_batch_norm:
+            x = module.bn(x)
+        if module._activation_fn is not None:
+            x = module._activation_fn(x)
+        return x
+
+    return _Temporal(module._kernel_shape[0], module._stride[0], op, fill=fill)
+
+
+def _pool(module: nn.MaxPool3d) -> _Temporal:
+    def op(x: torch.Tensor) -> torch.Tensor:
+        return F.max_pool3d(_spatial_pad(module, x), module.kernel_size, module.stride)
+
+    return _Temporal(module.kernel_size[0], module.stride[0], op)
+
+
+def _node(module: nn.Module):
+    if isinstance(module, nn.Sequential):
+        return _Sequence([_node(child) for child in module])
+    if isinstance(module, nn.MaxPool3d):
+        return _pool(module)
+    if hasattr(module, "b3a"):
+        return _Inception(module)
+    if hasattr(module, "conv3d"):
+        return _unit(module)
+    raise TypeError(f"Módulo sin versión en flujo: {type(module).__name__}")
+
+
+class StreamingI3D:
+    """Inferencia continua con InceptionI3d reutilizando el cómputo entre ventanas.
+
+    Cada conv y pool temporal guarda los frames de entrada que aún necesita
+    (como mucho `kernel - 1` más los del paso), así que cada frame nuevo
+    atraviesa la red una sola vez. Tras inception_5 hay un frame de
+    características cada `TEMPORAL_STRIDE` frames de entrada; la cabeza
+    promedia `last_duration` de ellos, de modo que sale una predicción por cada
+    8 frames, equivalente a una ventana de `num_in_frames` con paso 8 y
+    `t_mid = 8 * i + num_in_frames / 2`.
+
+    Diferencias con evaluar ventanas sueltas (`windowed_inference`):
+
+    - Una ventana aislada rellena con ceros su principio y su final en cada
+      capa con padding SAME; aquí las capas ven los frames reales vecinos y
+      solo se rellena al principio y al final del flujo. Las predicciones
+      del interior del video no coinciden con las de la ventana equivalente:
+      el campo receptivo de cada una se extiende más allá de sus 16 frames.
+    - Con el flujo completo (`push` de todo y `flush`) el resultado es el del
+      modelo evaluado sobre el video entero cuando su longitud es múltiplo de
+      8; si no, el padding SAME de las capas con paso 2 repartiría distinto
+      el relleno y los primeros frames difieren ligeramente.
+    - No hay predicciones a paso 1: para eso hace falta `windowed_inference`.
+
+    Las entradas son `(B, C, t, H, W)` ya normalizadas, con cualquier `t`, o
+    uint8 sin normalizar si el modelo viene de `for_uint8_input`; el modelo
+    debe estar en modo eval. El padding fijado con `plan_padding` se
+    ignora: el engine rellena él mismo en alto y ancho.
+    """
+
+    def __init__(self, model: nn.Module) -> None:
+        if model.training:
+            raise RuntimeError("El modelo debe estar en modo eval para la inferencia en flujo")
+
+        self.model: nn.Module = model
+        self.body: _Sequence = _Sequence(
+            [
+                _node(model.stem),
+                _node(model.inception_3),
+                _node(model.pool_4a),
+                _node(model.inception_4),
+                _node(model.pool_5a),
+                _node(model.inception_5),
+            ]
+        )
+        self.last_duration: int = model.avgpool.kernel_size[0]
+        self.head: _Temporal = _Temporal(self.last_duration, 1, model.avgpool, same=False)
+        self.logits: _Temporal = _unit(model.logits)
+        self.reset()
+
+    def reset(self) -> None:
+        """Empieza un flujo nuevo."""
+        self.body.reset()
+        self.head.reset()
+        self.logits.reset()
+        self.emitted: int = 0
+
+    def _outputs(self, features: torch.Tensor | None) -> dict[str, torch.Tensor]:
+        embds = self.head.push(features) if features is not None else None
+        if embds is None:
+            return {}
+
+        logits = self.logits.push(embds)
+        # (B, clases, n, 1, 1) → (B, n, clases)
+        outputs = {"logits": logits.flatten(3).squeeze(3).transpose(1, 2)}
+        if self.model.include_embds:
+            outputs["embds"] = embds.flatten(3).squeeze(3).transpose(1, 2)
+
+        count = logits.shape[2]
+        first = self.emitted
+        self.emitted += count
+        outputs["t_mid"] = (
+            TEMPORAL_STRIDE * torch.arange(first, first + count, dtype=torch.float64)
+            + TEMPORAL_STRIDE * self.last_duration / 2
+        )
+        return outputs
+
+    def push(self, frames: torch.Tensor) -> dict[str, torch.Tensor]:
+        """Procesa frames nuevos y devuelve las predicciones que ya se pueden emitir.
+
+        `logits` es `(B, n, clases)` con `n` posiblemente 0 (diccionario vacío)
+        mientras el campo receptivo de la siguiente predicción no esté completo.
+        """
+        with torch.no_grad():
+            return self._outputs(self.body.push(frames))
+
+    def flush(self) -> dict[str, torch.Tensor]:
+        """Cierra el flujo con el relleno final y devuelve las predicciones restantes."""
+        with torch.no_grad():
+            outputs = self._outputs(self.body.flush())
+        self.reset()
+        return outputs
+
+    def run(self, video: torch.Tensor, chunk: int = TEMPORAL_STRIDE) -> dict[str, torch.Tensor]:
+        """Pasa un video `(B, C, T, H, W)` entero en trozos de `chunk` frames."""
+        results: dict[str, list[torch.Tensor]] = {}
+        parts = [self.push(video[:, :, t : t + chunk]) for t in range(0, video.shape[2], chunk)]
+        for outputs in parts + [self.flush()]:
+            for key, value in outputs.items():
+                results.setdefault(key, []).append(value)
+        return {
+            key: torch.cat(values, dim=0 if key == "t_mid" else 1)
+            for key, values in results.items()
+        }